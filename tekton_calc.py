@@ -1,9 +1,27 @@
+import bisect
+import cProfile
+import contextlib
+import copy
+import functools
+import hashlib
+import io
+import itertools
+import json
 import math
+import os
+import pickle
+import pstats
 import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from enum import IntEnum
-import matplotlib.pyplot as plt
 import numpy as np
-from scipy import stats
 
 # Constants.
 BASE_HP = 300
@@ -35,6 +53,34 @@ DEF_LEAVE_THRESHOLD = 50
 CUTOFF_TICK = 28
 # Choose what time is considered runable: 24, 26.4, 28.8, 31.2, etc.
 RUNABLE_TIME = 28.8
+# Room timing in ticks, used to line kills up with the game's 4-tick cycle.
+ENTRY_TICKS = 11
+DEATH_ANIM = 4
+OVERKILL_DEATH_ANIM = 3
+# On tick 28 Tekton starts walking back to the anvil, slowing down the death animation.
+WALKBACK_TICK = 28
+WALKBACK_DEATH_ANIM = 6
+CRYSTAL_ANIM = 4
+# Number of damage tables kept per attack type, the least recently used ones are dropped first.
+DAMAGE_TABLE_CACHE_SIZE = 4096
+# Number of raids the batch engine simulates at once. Lower it if memory is tight.
+BATCH_SIZE = 100000
+# Folder where compiled scenario files are cached.
+SCENARIO_CACHE_DIR = '.scenario_cache'
+# Scenario used by createTeam instead of the built-in teams, see load_scenario.
+SCENARIO = None
+# SQLite file where simulated kills are stored per scenario, see stored_table.
+RESULT_STORE = 'tekton_results.sqlite'
+# Number of kills per random stream in the result store. Changing it changes which kills a store holds.
+STORE_BLOCK_SIZE = 100000
+# Bump whenever a change to the simulator changes its results, so stored kills from older versions aren't reused.
+SIMULATOR_VERSION = 2
+# JSON file run_benchmarks saves its results to, to gate later runs against.
+BENCHMARK_BASELINE = 'benchmark_baseline.json'
+# Number of raids run_benchmarks measures each engine's peak memory on, whatever the number of raids it times.
+BENCHMARK_MEMORY_RAIDS = 10000
+# Scenario every engine has to agree on in run_benchmarks.
+REFERENCE_SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scenarios', 'cm5_rancour.toml')
 
 # Function to calculate scaled HP.
 def calculate_scaled_hp(base_hp, num_players, challenge_mode):
@@ -64,10 +110,22 @@ def calculate_scaled_max(base_off, num_players, challenge_mode):
     scaled_max = math.floor((math.floor((scaled_off + 9) * (BASE_STR + 64) / 64) + 5) / 10)
     return scaled_max
 
+# Returns the scaled HP, DEF and Max hit for a team size and mode, every combination is only calculated once.
+@functools.lru_cache(maxsize=None)
+def scaled_stats(num_players, challenge_mode):
+    return (calculate_scaled_hp(BASE_HP, num_players, challenge_mode),
+            calculate_scaled_def(BASE_DEF, num_players, challenge_mode),
+            calculate_scaled_max(BASE_OFF, num_players, challenge_mode))
+
+# Returns the settings to pass to settings() to simulate another team size or mode, with the built-in team for that size
+# instead of the team of an applied scenario.
+def scale_settings(num_players, challenge_mode):
+    hitpoints, defence, maxhit = scaled_stats(num_players, challenge_mode)
+    return {'SCENARIO': None, 'NUMBER_OF_PLAYERS': num_players, 'CHALLENGE_MODE': challenge_mode,
+            'hitpoints': hitpoints, 'defence': defence, 'initial_defence': defence, 'maxhit': maxhit}
+
 # Calculate the scaled HP, DEF and Max hit.
-hitpoints = calculate_scaled_hp(BASE_HP, NUMBER_OF_PLAYERS, CHALLENGE_MODE)
-defence = calculate_scaled_def(BASE_DEF, NUMBER_OF_PLAYERS, CHALLENGE_MODE)
-maxhit = calculate_scaled_max(BASE_OFF, NUMBER_OF_PLAYERS, CHALLENGE_MODE)
+hitpoints, defence, maxhit = scaled_stats(NUMBER_OF_PLAYERS, CHALLENGE_MODE)
 initial_defence = defence
 
 # Scythe style bonus.
@@ -78,13 +136,21 @@ class Style(IntEnum):
 
 # Class to create a Tekton instance.
 class Tekton():
+    __slots__ = ('hp', 'defence', 'maxhit', 'initial_hp', 'initial_defence', 'burn_stacks', 'burn_cooldown', 'tick')
+
     def __init__(self, hp, defence, maxhit):
-        self.hp = hp
-        self.defence = defence
         self.maxhit = maxhit
+        self.initial_hp = hp
         self.initial_defence = defence
+        self.reset()
+
+    # Restores Tekton to full health and defence, so the same instance can be reused for the next kill.
+    def reset(self):
+        self.hp = self.initial_hp
+        self.defence = self.initial_defence
         self.burn_stacks = 0
         self.burn_cooldown = 0
+        self.tick = 0
 
     def get_hp(self):
         return self.hp
@@ -101,11 +167,11 @@ class Tekton():
     def reduce_defence(self, amount):
         self.defence -= amount
 
-    def do_venge_damage(self, melee_pray):
+    def do_venge_damage(self, melee_pray, rng=random):
         if melee_pray:
-            return random.randint(1, math.floor(self.maxhit / 2))
+            return rng.randint(1, math.floor(self.maxhit / 2))
         else:
-            return random.randint(1, self.maxhit)
+            return rng.randint(1, self.maxhit)
         
     def apply_burn(self, stacks):
         self.burn_stacks = min(self.burn_stacks + stacks, 5)
@@ -287,85 +353,28 @@ def sim_acc(tekton, style, maxAttRoll):
     return accuracy
 
 # Performs a scythe attack against Tekton.
-def do_scythe(tekton, style, maxAttRoll, maxHit):
-    accuracy = sim_acc(tekton, style, maxAttRoll)
-    hits = 0
-    for x in range(0, 3):
-        accuracy_rand = random.uniform(0, 1)
-        hit = int(random.randint(0, maxHit) / max(1, x * 2))
-        if hit == 0: hit = 1 # REBALANCE UPDATE
-        if accuracy >= accuracy_rand:
-            hits += hit
-    tekton.hp -= hits
+def do_scythe(tekton, style, maxAttRoll, maxHit, rng=random):
+    damage, _ = scythe_table(tekton.defence, style, maxAttRoll, maxHit).sample(rng.random())
+    tekton.hp -= damage
     return
 
 # Performs an elder maul attack against Tekton.
-def do_maul(tekton, maxAttRoll, maxHit):
-    accuracy = sim_acc(tekton, Style.CRUSH, maxAttRoll)
-    accuracy_rand = random.uniform(0, 1)
-    hit = random.randint(0, maxHit)
-    if tekton.defence == tekton.initial_defence:
-        tekton.defence = math.ceil(tekton.defence * 0.65)
-        tekton.hp -= hit
-        return
-    if accuracy >= accuracy_rand:
-        tekton.defence = math.ceil(tekton.defence * 0.65)
-        tekton.hp -= hit
-        return
-    else:
-        tekton.defence = math.ceil(tekton.defence * 0.95)
-        return
-    
+def do_maul(tekton, maxAttRoll, maxHit, rng=random):
+    damage, tekton.defence = maul_table(tekton.defence, tekton.initial_defence, maxAttRoll, maxHit).sample(rng.random())
+    tekton.hp -= damage
+    return
+
 # Performs a bgs attack against Tekton.
-def do_bgs(tekton, maxAttRoll, maxHit):
-    accuracy = sim_acc(tekton, Style.SLASH, maxAttRoll)
-    accuracy_rand = random.uniform(0, 1)
-    hit = random.randint(0, maxHit)
-    if hit == 0: hit = 1 # REBALANCE UPDATE
-    if accuracy >= accuracy_rand:
-        tekton.defence -= hit
-        tekton.hp -= hit
-    else:
-        tekton.defence -= 10
-    # Make sure defence never goes below 0   
-    if tekton.defence < 0:
-        tekton.defence = 0
+def do_bgs(tekton, maxAttRoll, maxHit, rng=random):
+    damage, tekton.defence = bgs_table(tekton.defence, maxAttRoll, maxHit).sample(rng.random())
+    tekton.hp -= damage
     return
 
 # Performs a claw attack against Tekton.
-def do_claw(tekton, maxAttRoll, maxHit):
-    maxDefRoll = (int)((9 + tekton.defence) * (64 + Style.SLASH))
-    if (rnd(maxAttRoll) > rnd(maxDefRoll)):
-        one = int(rnd(int(maxHit), int(maxHit/2)))
-        two = int(one/2)
-        three = int(two/2)
-        four = int(three+1)
-        hit = one + two + three + four
-        tekton.hp -= hit
-        return
-    elif (rnd(maxAttRoll) > rnd(maxDefRoll)):
-        one = int(rnd(int(7*maxHit/8), int(3*maxHit/8)))
-        two = int(one/2)
-        three = int(two+1)
-        hit = one + two + three
-        tekton.hp -= hit
-        return
-    elif (rnd(maxAttRoll) > rnd(maxDefRoll)):
-        one = int(rnd(int(3*maxHit/4), int(maxHit/4)))
-        two = int(one+1)
-        hit = one + two
-        tekton.hp -= hit
-        return
-    elif (rnd(maxAttRoll) > rnd(maxDefRoll)):
-        hit = int(rnd(int(5*maxHit/4), int(maxHit/4)))
-        tekton.hp -= hit
-        return
-    else:
-        if (rnd(1) != 0):
-            tekton.hp -= 2
-            return
-        else:
-            return
+def do_claw(tekton, maxAttRoll, maxHit, rng=random):
+    damage, _ = claw_table(tekton.defence, maxAttRoll, maxHit).sample(rng.random())
+    tekton.hp -= damage
+    return
 
 # NOT DONE        
 def do_bone_claw(tekton, maxAttRoll, maxHit):
@@ -384,47 +393,254 @@ def do_bone_claw(tekton, maxAttRoll, maxHit):
             hits += hit
     tekton.hp -= hits
 
-# Helper function for the claw attack function.
-def rnd(n, m = 0):
-    return random.randint(m, n)
-
 # Simulates a thrall attack based on the provided thrall tier.
-def sim_thrall(tekton, tier):
+def sim_thrall(tekton, tier, rng=random):
     match tier:
         case 1:
-            tekton.hp -= random.randint(0, 1)
+            tekton.hp -= rng.randint(0, 1)
             return
         case 2:
-            tekton.hp -= random.randint(0, 2)
+            tekton.hp -= rng.randint(0, 2)
             return
         case 3:
-            tekton.hp -= random.randint(0, 3)
+            tekton.hp -= rng.randint(0, 3)
             return
 
+# Chance that a uniform roll from 0 to maxAttRoll beats one from 0 to maxDefRoll, like the accuracy rolls of a claw spec.
+def roll_beats(maxAttRoll, maxDefRoll):
+    m = min(maxDefRoll, maxAttRoll - 1)
+    if m < 0:
+        return 0.0
+    return ((m + 1) * maxAttRoll - m * (m + 1) // 2) / ((maxAttRoll + 1) * (maxDefRoll + 1))
+
+# Probability mass function of a random.randint(low, high) roll, indexed by value.
+def uniform_pmf(low, high):
+    pmf = np.zeros(high + 1)
+    pmf[low:] = 1 / (high - low + 1)
+    return pmf
+
+# Damage distribution of a do_scythe attack, indexed by damage.
+@functools.lru_cache(maxsize=DAMAGE_TABLE_CACHE_SIZE)
+def scythe_pmf(defence, style, maxAttRoll, maxHit):
+    accuracy = float(sim_acc_batch(defence, style, maxAttRoll))
+    pmf = np.ones(1)
+    for divisor in [1, 2, 4]:
+        hit = np.bincount(np.maximum(np.arange(maxHit + 1) // divisor, 1)) / (maxHit + 1) * accuracy # REBALANCE UPDATE
+        hit[0] += 1 - accuracy
+        pmf = np.convolve(pmf, hit)
+    pmf.flags.writeable = False
+    return pmf
+
+# Damage distribution of a do_claw attack, indexed by damage. The claw rolls accuracy up to four times and the first
+# roll that lands picks the tier, each tier's total damage is a function of the first hit only.
+@functools.lru_cache(maxsize=DAMAGE_TABLE_CACHE_SIZE)
+def claw_pmf(defence, maxAttRoll, maxHit):
+    accuracy = roll_beats(maxAttRoll, (9 + defence) * (64 + Style.SLASH))
+    tiers = [
+        (maxHit // 2, maxHit, lambda one: one + one // 2 + 2 * (one // 4) + 1),
+        (3 * maxHit // 8, 7 * maxHit // 8, lambda one: one + 2 * (one // 2) + 1),
+        (maxHit // 4, 3 * maxHit // 4, lambda one: 2 * one + 1),
+        (maxHit // 4, 5 * maxHit // 4, lambda one: one),
+        (0, 1, lambda one: 2 * one),
+    ]
+    pmf = np.zeros(3 * maxHit)
+    for i, (low, high, damage) in enumerate(tiers):
+        chance = (1 - accuracy) ** i * (accuracy if i < 4 else 1)
+        hits = damage(np.arange(low, high + 1))
+        pmf[:hits.max() + 1] += np.bincount(hits) / len(hits) * chance
+    pmf.flags.writeable = False
+    return pmf
+
+# Class to hold every outcome of an attack with its cumulative chance, so an attack needs a single uniform draw.
+# missed flags the outcomes where the attack missed, weight is the likelihood ratio of every outcome (see tilted).
+class DamageTable:
+    def __init__(self, damage, defence, chances, missed=None, weight=None):
+        keep = chances > 0
+        self.damage = np.asarray(damage, dtype=np.int64)[keep]
+        self.defence = np.asarray(defence, dtype=np.int64)[keep]
+        self.chances = chances[keep] / chances[keep].sum()
+        self.missed = np.zeros(len(chances), dtype=bool)[keep] if missed is None else np.asarray(missed, dtype=bool)[keep]
+        self.weight = np.ones(len(chances))[keep] if weight is None else np.asarray(weight, dtype=np.float64)[keep]
+        self.cdf = np.cumsum(self.chances)
+        self.cdf /= self.cdf[-1]
+        # Plain lists for the scalar simulator, bisect beats NumPy on single draws.
+        self.cdf_list = self.cdf.tolist()
+        self.damage_list = self.damage.tolist()
+        self.defence_list = self.defence.tolist()
+
+    # Returns the damage and Tekton's defence after the attack for a single uniform draw.
+    def sample(self, u):
+        i = bisect.bisect_right(self.cdf_list, u)
+        return self.damage_list[i], self.defence_list[i]
+
+    # Returns arrays of damage and defence after the attack for an array of uniform draws.
+    def sample_batch(self, u):
+        i = np.searchsorted(self.cdf, u, side='right')
+        return self.damage[i], self.defence[i]
+
+    # Returns a copy of the table that picks a miss (or a hit, if towards_miss is False) bias more often,
+    # by mixing in the chances given that outcome. weight holds the true chance over the tilted one of every outcome,
+    # multiplying the weights of a kill's attacks gives an unbiased weight for the kill.
+    def tilted(self, towards_miss, bias):
+        event = self.missed if towards_miss else ~self.missed
+        event_chance = self.chances[event].sum()
+        if event_chance == 0 or event_chance == 1:
+            return self
+        chances = (1 - bias) * self.chances + bias * np.where(event, self.chances / event_chance, 0)
+        return DamageTable(self.damage, self.defence, chances, self.missed, self.chances / chances)
+
+# Outcomes of a do_scythe attack.
+@functools.lru_cache(maxsize=DAMAGE_TABLE_CACHE_SIZE)
+def scythe_table(defence, style, maxAttRoll, maxHit):
+    pmf = scythe_pmf(defence, style, maxAttRoll, maxHit)
+    return DamageTable(np.arange(len(pmf)), np.full(len(pmf), defence), pmf)
+
+# Outcomes of a do_claw attack.
+@functools.lru_cache(maxsize=DAMAGE_TABLE_CACHE_SIZE)
+def claw_table(defence, maxAttRoll, maxHit):
+    pmf = claw_pmf(defence, maxAttRoll, maxHit)
+    return DamageTable(np.arange(len(pmf)), np.full(len(pmf), defence), pmf)
+
+# Outcomes of a do_maul attack. The first maul on Tekton's initial defence always hits.
+@functools.lru_cache(maxsize=DAMAGE_TABLE_CACHE_SIZE)
+def maul_table(defence, initial_defence, maxAttRoll, maxHit):
+    accuracy = 1.0 if defence == initial_defence else float(sim_acc_batch(defence, Style.CRUSH, maxAttRoll))
+    damage = np.append(np.arange(maxHit + 1), 0)
+    new_defence = np.append(np.full(maxHit + 1, math.ceil(defence * 0.65)), math.ceil(defence * 0.95))
+    chances = np.append(uniform_pmf(0, maxHit) * accuracy, 1 - accuracy)
+    return DamageTable(damage, new_defence, chances, np.arange(maxHit + 2) == maxHit + 1)
+
+# Outcomes of a do_bgs attack. Defence never goes below 0.
+@functools.lru_cache(maxsize=DAMAGE_TABLE_CACHE_SIZE)
+def bgs_table(defence, maxAttRoll, maxHit):
+    accuracy = float(sim_acc_batch(defence, Style.SLASH, maxAttRoll))
+    hits = np.arange(1, maxHit + 1)
+    damage = np.append(hits, 0)
+    new_defence = np.maximum(np.append(defence - hits, defence - 10), 0)
+    chances = np.append(np.where(hits == 1, 2, 1) / (maxHit + 1) * accuracy, 1 - accuracy) # REBALANCE UPDATE
+    return DamageTable(damage, new_defence, chances, np.arange(maxHit + 1) == maxHit)
+
+# Returns the hit and miss counters of the damage table caches, to help sizing DAMAGE_TABLE_CACHE_SIZE.
+def damage_table_stats():
+    return {table.__name__: table.cache_info()._asdict() for table in [scythe_table, claw_table, maul_table, bgs_table]}
+
+# Fills the damage table caches for every defence the team can bring Tekton down to.
+def warm_damage_tables(team=None):
+    for r in team or createTeam():
+        loadout = r.loadout
+        for d in range(defence + 1):
+            scythe_table(d, loadout.style, *loadout.scythe)
+            if loadout.claws:
+                claw_table(d, *loadout.claws)
+            if r.specwep == 'maul':
+                maul_table(d, defence, *loadout.spec)
+            if loadout.spec and (r.specwep == 'bgs' or r.re_bgs_threshold > 0):
+                bgs_table(d, *loadout.spec)
+
+# Stacks the tables of every defence from 0 up to Tekton's initial defence for one loadout, so batches of attacks
+# on different defences can be drawn with a single search. Row r of the cdf is shifted up by r.
+# tilt is None or the (towards_miss, bias) arguments of DamageTable.tilted.
+@functools.lru_cache(maxsize=DAMAGE_TABLE_CACHE_SIZE)
+def stack_tables(table, tilt, initial_defence, *key):
+    tables = [table(d, *key) for d in range(initial_defence + 1)]
+    if tilt:
+        tables = [t.tilted(*tilt) for t in tables]
+    width = max(len(t.cdf) for t in tables)
+    cdf = np.ones((len(tables), width))
+    damage = np.zeros((len(tables), width), dtype=np.int64)
+    new_defence = np.zeros((len(tables), width), dtype=np.int64)
+    weight = np.ones((len(tables), width))
+    for d, t in enumerate(tables):
+        cdf[d, :len(t.cdf)] = t.cdf
+        damage[d, :len(t.cdf)] = t.damage
+        new_defence[d, :len(t.cdf)] = t.defence
+        weight[d, :len(t.cdf)] = t.weight
+    return (cdf + np.arange(len(tables))[:, None]).ravel(), damage.ravel(), new_defence.ravel(), weight.ravel(), width
+
+# Picks one outcome per attack from the damage tables for the uniform draws in u. members holds the team index of
+# every attacker and keys the table arguments after defence for every team member, attacks by the same member are
+# looked up together. Returns the damage, the new defence and the likelihood ratio of every attack, which is 1 unless
+# tilt is set.
+def sample_tables(u, table, defences, members, keys, tilt=None):
+    damage = np.empty(len(defences), dtype=np.int64)
+    new_defence = np.empty(len(defences), dtype=np.int64)
+    weight = np.empty(len(defences))
+    for member in np.unique(members):
+        ids = np.flatnonzero(members == member)
+        cdf, stacked_damage, stacked_defence, stacked_weight, _ = stack_tables(table, tilt, defence, *keys[member])
+        found = np.searchsorted(cdf, u[ids] + defences[ids], side='right')
+        damage[ids] = stacked_damage[found]
+        new_defence[ids] = stacked_defence[found]
+        weight[ids] = stacked_weight[found]
+    return damage, new_defence, weight
+
+# Class to hold a Raider's accuracy and max hit per weapon, looked up once when the Raider is created.
+# spec and claws are (acc, max) tuples, or None if the Raider doesn't bring them.
+class Loadout:
+    __slots__ = ('spec', 'claws', 'scythe', 'style')
+
+    def __init__(self, name, boost, armour, amulet, ring, specwep, claws):
+        try:
+            acc_max_values = ACCURACY_MAX_VALUES[boost][armour][amulet][ring]
+        except KeyError as e:
+            raise ValueError(f"{name} has no accuracy and max hit values for {boost}/{armour}/{amulet}/{ring}, missing {e}") from None
+        weapons = ['scythe'] + ([specwep] if specwep in ['maul', 'bgs'] else []) + (['claws'] if claws else [])
+        missing = [weapon for weapon in weapons if weapon not in acc_max_values]
+        if missing:
+            raise ValueError(f"{name} has no accuracy and max hit values for {', '.join(missing)} with {boost}/{armour}/{amulet}/{ring}")
+        values = {weapon: (acc_max_values[weapon]['acc'], acc_max_values[weapon]['max']) for weapon in weapons}
+        self.spec = values.get(specwep)
+        self.claws = values.get('claws')
+        self.scythe = values['scythe']
+        self.style = Style.CRUSH if armour == 'inq' else Style.SLASH
+
 # Class to create a Raider instance.
 class Raider:
+    __slots__ = ('pid', 'name', 'armour', 'specwep', 'claws', 'amulet', 'ring', 'boost', 'thrall', 'delay', 'thrallTier', 're_bgs_threshold',
+                 'initial_hp', 'initial_energy', 'initial_vengeAmount', 'initial_meleePray', 'initial_start_with_scythe',
+                 'loadout', 'rng', 'hp', 'energy', 'vengeAmount', 'meleePray', 'start_with_scythe', 'cooldown', 'thrallCooldown', 'hasSpecced')
+
     def __init__(self, pid, name, hp, armour, specwep, claws, amulet, ring, boost, energy, thrall, delay, thrallTier=3, vengeAmount=0, meleePray=False, re_bgs_threshold=0, start_with_scythe=False):
         self.pid = pid
         self.name = name
-        self.hp = hp
         self.armour = armour
         self.specwep = specwep
         self.claws = claws
         self.amulet = amulet
         self.ring = ring
         self.boost = boost
-        self.energy = energy
         self.thrall = thrall
         self.delay = delay
         self.thrallTier = thrallTier
-        self.vengeAmount = vengeAmount
-        self.meleePray = meleePray
         self.re_bgs_threshold = re_bgs_threshold
-        self.start_with_scythe = start_with_scythe
+        self.initial_hp = hp
+        self.initial_energy = energy
+        self.initial_vengeAmount = vengeAmount
+        self.initial_meleePray = meleePray
+        self.initial_start_with_scythe = start_with_scythe
+        self.loadout = Loadout(name, boost, armour, amulet, ring, specwep, claws)
+        # Source of the Raider's random rolls, compare gives every Raider its own stream.
+        self.rng = random
+        self.reset()
+
+    # The random module can't be pickled, so Raiders sent to other processes or cached roll from the random module.
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name != 'rng'}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.rng = random
+
+    # Restores the state that changes during a kill, so the same Raider can be reused for the next kill.
+    def reset(self):
+        self.hp = self.initial_hp
+        self.energy = self.initial_energy
+        self.vengeAmount = self.initial_vengeAmount
+        self.meleePray = self.initial_meleePray
+        self.start_with_scythe = self.initial_start_with_scythe
         self.cooldown = 0
         self.thrallCooldown = 1 # Not 0, because it never spawns adjecent to the boss
-        self.acc = None
-        self.max = None
         self.hasSpecced = False
         self.set_delayed_attack()
 
@@ -432,93 +648,58 @@ class Raider:
     def set_delayed_attack(self):
         self.cooldown = self.delay
 
-    # Sets the Raider's accuracy and max hit, based on their respective boost, armour, ring and weapon
-    def set_acc_and_max(self, spec=False, force_scythe=False):
-        try:
-            acc_max_values = ACCURACY_MAX_VALUES[self.boost][self.armour][self.amulet][self.ring]
-
-            # Update acc and max based on initial specwep
-            if spec:
-                self.acc = acc_max_values[self.specwep]['acc']
-                self.max = acc_max_values[self.specwep]['max']
-            else:
-                # Check for claws and update if necessary
-                if self.claws and self.energy >= 50 and not force_scythe:
-                    claws_values = acc_max_values['claws']
-                    self.acc = claws_values['acc']
-                    self.max = claws_values['max']
-                else:
-                    #print(f'Forced scythe: {force_scythe}')
-                    scythe_values = acc_max_values['scythe']
-                    self.acc = scythe_values['acc']
-                    self.max = scythe_values['max']
-
-        except KeyError as e:
-            print(f"Error: Missing value for {e}")
-
     # Simulates an attack for the Raider.
     def attack(self, tekton, re_bgs=False):
+        loadout = self.loadout
 
         # Lets the Raider do a scythe attack before performing a special attack.
         if self.start_with_scythe:
-            self.set_acc_and_max(force_scythe=True)
-            if self.armour == 'inq':
-                style = Style.CRUSH
-            else:
-                style = Style.SLASH
             self.cooldown += 4
             #print(f'{self.name} forced scything')
-            do_scythe(tekton, style, self.acc, self.max)
+            do_scythe(tekton, loadout.style, *loadout.scythe, self.rng)
             self.start_with_scythe = False
             return
 
         # Makes the Raider perform a special attack based on their respective spec weapon.
         if not self.hasSpecced and self.energy >= 50 and self.specwep in ['maul', 'bgs']:
-            self.set_acc_and_max(spec=True)
             self.energy -= 50
             self.hasSpecced = True
             if self.specwep == 'maul':
                 self.cooldown += 5
                 #print(f'{self.name} mauling')
-                do_maul(tekton, self.acc, self.max)
+                do_maul(tekton, *loadout.spec, self.rng)
                 return
             elif self.specwep == 'bgs':
                 self.cooldown += 5
                 #print(f'{self.name} bgsing first time')
-                do_bgs(tekton, self.acc, self.max)
+                do_bgs(tekton, *loadout.spec, self.rng)
                 return
             
         # Lets the Raider perform another bgs spec if they're assigned to do so.
         if re_bgs:
-            self.set_acc_and_max(spec=True)
             self.energy -= 50
             self.hasSpecced = True
             self.cooldown += 5
             #print(f'{self.name} bgsing again')
-            do_bgs(tekton, self.acc, self.max)
+            do_bgs(tekton, *loadout.spec, self.rng)
             return
 
         # Makes the Raider perform a claw spec if they have them and will otherwise default to a scythe attack.
-        self.set_acc_and_max()
         if self.claws and self.energy >= 50:
             self.cooldown += 3
             self.energy -= 50
-            do_claw(tekton, self.acc, self.max)
+            do_claw(tekton, *loadout.claws, self.rng)
             return
         else:
-            if self.armour == 'inq':
-                style = Style.CRUSH
-            else:
-                style = Style.SLASH
             self.cooldown += 4
             #print(f'{self.name} scything')
-            do_scythe(tekton, style, self.acc, self.max)
+            do_scythe(tekton, loadout.style, *loadout.scythe, self.rng)
             return
         
     # Performs a thrall attack if the Raider has one.
     def thrall_attack(self, tekton):
         self.thrallCooldown += 3
-        sim_thrall(tekton, self.thrallTier)
+        sim_thrall(tekton, self.thrallTier, self.rng)
         return
     
     # Deals vengeance damage to Tekton if the Raider is venged.
@@ -531,7 +712,7 @@ class Raider:
             self.vengeAmount = 0
             return
         
-        damage = tekton.do_venge_damage(self.meleePray)
+        damage = tekton.do_venge_damage(self.meleePray, self.rng)
         #print(f"{self.name} venged for {damage}, which damaged Tekton for {max(math.floor(damage * VENGE_DAMAGE_MULTIPLIER), 1)}")
         self.hp -= damage
         tekton.hp -= max(math.floor(damage * VENGE_DAMAGE_MULTIPLIER), 1)
@@ -539,45 +720,47 @@ class Raider:
 
 # Create a team of Raiders with individual properties.
 def createTeam():
+    if SCENARIO is not None:
+        return SCENARIO.create_team()
     if not CHALLENGE_MODE:
         match NUMBER_OF_PLAYERS:
             case 1:
-                return [Raider(pid=random.randint(0,2000), name='TorvaSolo', hp=121, armour='torva', specwep='maul', claws=False, ring='ultor', boost='ovl', energy=50, thrall=True, delay=0)]
+                return [Raider(pid=random.randint(0,2000), name='TorvaSolo', hp=121, armour='torva', specwep='maul', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=50, thrall=True, delay=0)]
             case 2:
-                return [Raider(pid=random.randint(0,2000), name='Cross', hp=121, armour='torva', specwep='maul', claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=0),
-                        Raider(pid=random.randint(0,2000), name='Chin', hp=121, armour='torva', specwep='maul', claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=0)]
+                return [Raider(pid=random.randint(0,2000), name='Cross', hp=121, armour='torva', specwep='maul', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=0),
+                        Raider(pid=random.randint(0,2000), name='Chin', hp=121, armour='torva', specwep='maul', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=0)]
             case 3:
-                return [Raider(pid=random.randint(0,2000), name='Cross', hp=121, armour='torva', specwep='bgs', claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=0),
-                        Raider(pid=random.randint(0,2000), name='Chin', hp=121, armour='torva', specwep='bgs', claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=0),
-                        Raider(pid=random.randint(0,2000), name='Telegrab', hp=121, armour='torva', specwep='maul', claws=False, ring='ultor', boost='ovl', energy=100, thrall=False, delay=0)]
+                return [Raider(pid=random.randint(0,2000), name='Cross', hp=121, armour='torva', specwep='bgs', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=0),
+                        Raider(pid=random.randint(0,2000), name='Chin', hp=121, armour='torva', specwep='bgs', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=0),
+                        Raider(pid=random.randint(0,2000), name='Telegrab', hp=121, armour='torva', specwep='maul', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=False, delay=0)]
             case 5:
-                return [Raider(pid=random.randint(0,2000), name='Cross', hp=121, armour='torva', specwep='bgs', claws=False, ring='ultor', boost='scb', energy=100, thrall=True, delay=0),
-                        Raider(pid=random.randint(0,2000), name='Chin', hp=121, armour='torva', specwep='bgs', claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=0),
-                        Raider(pid=random.randint(0,2000), name='Telegrab', hp=121, armour='torva', specwep='maul', claws=False, ring='ultor', boost='ovl', energy=100, thrall=False, delay=0),
-                        Raider(pid=random.randint(0,2000), name='Melee tank', hp=121, armour='torva', specwep='bgs', claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=0),
-                        Raider(pid=random.randint(0,2000), name='Mage tank', hp=121, armour='torva', specwep='maul', claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=0)]
+                return [Raider(pid=random.randint(0,2000), name='Cross', hp=121, armour='torva', specwep='bgs', claws=False, amulet='torture', ring='ultor', boost='scb', energy=100, thrall=True, delay=0),
+                        Raider(pid=random.randint(0,2000), name='Chin', hp=121, armour='torva', specwep='bgs', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=0),
+                        Raider(pid=random.randint(0,2000), name='Telegrab', hp=121, armour='torva', specwep='maul', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=False, delay=0),
+                        Raider(pid=random.randint(0,2000), name='Melee tank', hp=121, armour='torva', specwep='bgs', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=0),
+                        Raider(pid=random.randint(0,2000), name='Mage tank', hp=121, armour='torva', specwep='maul', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=0)]
             case 7:
-                return [Raider(pid=random.randint(0,2000), name='Cross', hp=121, armour='torva', specwep='bgs', claws=False, ring='ultor', boost='scb', energy=100, thrall=True, delay=1),
-                        Raider(pid=random.randint(0,2000), name='Chin', hp=121, armour='torva', specwep='bgs', claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=1),
-                        Raider(pid=random.randint(0,2000), name='Telegrab', hp=121, armour='torva', specwep='maul', claws=False, ring='ultor', boost='scb', energy=100, thrall=False, delay=0),
-                        Raider(pid=random.randint(0,2000), name='Melee tank', hp=121, armour='torva', specwep=None, claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=1),
-                        Raider(pid=random.randint(0,2000), name='Mage tank', hp=121, armour='torva', specwep='maul', claws=False, ring='ultor', boost='scb', energy=100, thrall=True, delay=0),
-                        Raider(pid=random.randint(0,2000), name='Leech 1', hp=121, armour='torva', specwep='bgs', claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=1),
-                        Raider(pid=random.randint(0,2000), name='Leech 2', hp=121, armour='torva', specwep=None, claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=1)]
+                return [Raider(pid=random.randint(0,2000), name='Cross', hp=121, armour='torva', specwep='bgs', claws=False, amulet='torture', ring='ultor', boost='scb', energy=100, thrall=True, delay=1),
+                        Raider(pid=random.randint(0,2000), name='Chin', hp=121, armour='torva', specwep='bgs', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=1),
+                        Raider(pid=random.randint(0,2000), name='Telegrab', hp=121, armour='torva', specwep='maul', claws=False, amulet='torture', ring='ultor', boost='scb', energy=100, thrall=False, delay=0),
+                        Raider(pid=random.randint(0,2000), name='Melee tank', hp=121, armour='torva', specwep=None, claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=1),
+                        Raider(pid=random.randint(0,2000), name='Mage tank', hp=121, armour='torva', specwep='maul', claws=False, amulet='torture', ring='ultor', boost='scb', energy=100, thrall=True, delay=0),
+                        Raider(pid=random.randint(0,2000), name='Leech 1', hp=121, armour='torva', specwep='bgs', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=1),
+                        Raider(pid=random.randint(0,2000), name='Leech 2', hp=121, armour='torva', specwep=None, claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=1)]
     else:
         match NUMBER_OF_PLAYERS:
             # Improper setups
             case 1:
-                return [Raider(pid=random.randint(0,2000), name='TorvaSolo', hp=121, armour='torva', specwep='maul', claws=False, ring='ultor', boost='ovl', energy=50, thrall=True, delay=0)]
+                return [Raider(pid=random.randint(0,2000), name='TorvaSolo', hp=121, armour='torva', specwep='maul', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=50, thrall=True, delay=0)]
             # Improper setups
             case 2:
-                return [Raider(pid=random.randint(0,2000), name='Cross', hp=121, armour='torva', specwep='maul', claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=0),
-                        Raider(pid=random.randint(0,2000), name='Chin', hp=121, armour='torva', specwep='maul', claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=0)]
+                return [Raider(pid=random.randint(0,2000), name='Cross', hp=121, armour='torva', specwep='maul', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=0),
+                        Raider(pid=random.randint(0,2000), name='Chin', hp=121, armour='torva', specwep='maul', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=0)]
             # Improper setups
             case 3:
-                return [Raider(pid=random.randint(0,2000), name='Cross', hp=121, armour='torva', specwep='bgs', claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=1),
-                        Raider(pid=random.randint(0,2000), name='Chin', hp=121, armour='torva', specwep='maul', claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=0),
-                        Raider(pid=random.randint(0,2000), name='Telegrab', hp=121, armour='torva', specwep='maul', claws=False, ring='ultor', boost='ovl', energy=100, thrall=False, delay=0)]
+                return [Raider(pid=random.randint(0,2000), name='Cross', hp=121, armour='torva', specwep='bgs', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=1),
+                        Raider(pid=random.randint(0,2000), name='Chin', hp=121, armour='torva', specwep='maul', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=0),
+                        Raider(pid=random.randint(0,2000), name='Telegrab', hp=121, armour='torva', specwep='maul', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=False, delay=0)]
             # Rancour
             case 5:
                 return [Raider(pid=random.randint(0,2000), name='Cross', hp=121, armour='torva', specwep='bgs', claws=True, amulet='rancour', ring='bellator', boost='scb', energy=100, thrall=False, delay=1, vengeAmount=1, re_bgs_threshold=CROSS_REBGS_THRESHOLD, start_with_scythe=False),
@@ -587,24 +770,166 @@ def createTeam():
                         Raider(pid=random.randint(0,2000), name='Enchangla', hp=121, armour='torva', specwep='maul', claws=True, amulet='rancour', ring='bellator', boost='scb', energy=100, thrall=False, delay=0, vengeAmount=1)]
             # Improper setups
             case 7:
-                return [Raider(pid=random.randint(0,2000), name='Cross', hp=121, armour='torva', specwep='bgs', claws=False, ring='ultor', boost='scb', energy=100, thrall=True, delay=1),
-                        Raider(pid=random.randint(0,2000), name='Chin', hp=121, armour='torva', specwep='bgs', claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=1),
-                        Raider(pid=random.randint(0,2000), name='Telegrab', hp=121, armour='torva', specwep='maul', claws=False, ring='ultor', boost='scb', energy=100, thrall=False, delay=0),
-                        Raider(pid=random.randint(0,2000), name='Melee tank', hp=121, armour='torva', specwep=None, claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=1),
-                        Raider(pid=random.randint(0,2000), name='Mage tank', hp=121, armour='torva', specwep='maul', claws=False, ring='ultor', boost='scb', energy=100, thrall=True, delay=0),
-                        Raider(pid=random.randint(0,2000), name='Leech 1', hp=121, armour='torva', specwep='bgs', claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=1),
-                        Raider(pid=random.randint(0,2000), name='Leech 2', hp=121, armour='torva', specwep=None, claws=False, ring='ultor', boost='ovl', energy=100, thrall=True, delay=1)]
-
-# Simulates a Tekton kill.
-def killTekton():
-    tekton = Tekton(hitpoints, defence, maxhit)
-    team = createTeam()
+                return [Raider(pid=random.randint(0,2000), name='Cross', hp=121, armour='torva', specwep='bgs', claws=False, amulet='torture', ring='ultor', boost='scb', energy=100, thrall=True, delay=1),
+                        Raider(pid=random.randint(0,2000), name='Chin', hp=121, armour='torva', specwep='bgs', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=1),
+                        Raider(pid=random.randint(0,2000), name='Telegrab', hp=121, armour='torva', specwep='maul', claws=False, amulet='torture', ring='ultor', boost='scb', energy=100, thrall=False, delay=0),
+                        Raider(pid=random.randint(0,2000), name='Melee tank', hp=121, armour='torva', specwep=None, claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=1),
+                        Raider(pid=random.randint(0,2000), name='Mage tank', hp=121, armour='torva', specwep='maul', claws=False, amulet='torture', ring='ultor', boost='scb', energy=100, thrall=True, delay=0),
+                        Raider(pid=random.randint(0,2000), name='Leech 1', hp=121, armour='torva', specwep='bgs', claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=1),
+                        Raider(pid=random.randint(0,2000), name='Leech 2', hp=121, armour='torva', specwep=None, claws=False, amulet='torture', ring='ultor', boost='ovl', energy=100, thrall=True, delay=1)]
+
+# Settings a scenario file may override.
+SCENARIO_SETTINGS = ['CROSS_REBGS_THRESHOLD', 'TELEGRAB_REBGS_THRESHOLD', 'DEF_LEAVE_THRESHOLD', 'CUTOFF_TICK', 'RUNABLE_TIME', 'CLOSE_LURE']
+# Settings a Raider's re_bgs_threshold can refer to by name in a scenario file.
+THRESHOLD_SETTINGS = ['CROSS_REBGS_THRESHOLD', 'TELEGRAB_REBGS_THRESHOLD']
+# Bump when the compiled form changes, so stale cache files are ignored.
+SCENARIO_FORMAT = 2
+
+# Class to hold a compiled scenario: the settings it overrides, Tekton's scaled stats and its Raiders with their
+# loadouts already looked up. Use it with `with scenario.applied():` to run the simulator on it.
+# Thresholds that refer to a setting keep its name in threshold_settings, by Raider index, and are looked up in
+# create_team, so the current value of the setting is used.
+class Scenario:
+    def __init__(self, name, players, challenge_mode, overrides, raiders, threshold_settings=None):
+        self.name = name
+        self.overrides = dict(overrides, **scale_settings(players, challenge_mode))
+        self.raiders = [Raider(pid=0, **raider) for raider in raiders]
+        self.threshold_settings = threshold_settings or {}
+
+    # Returns fresh copies of the Raiders with new pids, like createTeam.
+    def create_team(self):
+        team = [copy.copy(r) for r in self.raiders]
+        for i, setting in self.threshold_settings.items():
+            team[i].re_bgs_threshold = globals()[setting]
+        for r in team:
+            r.pid = random.randint(0,2000)
+        return team
+
+    # Applies the scenario's settings while the block runs.
+    def applied(self):
+        return settings(SCENARIO=self, **self.overrides)
+
+# Parses a scenario from a TOML or JSON file into a Scenario. The file holds players, challenge_mode, an optional
+# settings table with any of SCENARIO_SETTINGS and a raiders list with the arguments of Raider, minus pid.
+# TOML files need tomllib, or the tomli package before Python 3.11.
+def parse_scenario(path, content):
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:
+            import tomli as tomllib
+        config = tomllib.loads(content.decode())
+    else:
+        config = json.loads(content)
+    overrides = config.get('settings', {})
+    unknown = [name for name in overrides if name not in SCENARIO_SETTINGS]
+    if unknown:
+        raise ValueError(f"{path}: unknown settings {', '.join(unknown)}, choose from {', '.join(SCENARIO_SETTINGS)}")
+    if len(config['raiders']) != config['players']:
+        raise ValueError(f"{path}: {config['players']} players but {len(config['raiders'])} raiders")
+    # Thresholds may refer to a setting by name, e.g. re_bgs_threshold = "CROSS_REBGS_THRESHOLD". The name is kept and
+    # resolved whenever a team is created, so sweeps and settings() overrides of it apply.
+    raiders = []
+    threshold_settings = {}
+    for i, raider in enumerate(config['raiders']):
+        threshold = raider.get('re_bgs_threshold', 0)
+        if isinstance(threshold, str):
+            if threshold not in THRESHOLD_SETTINGS:
+                raise ValueError(f"{path}: {raider.get('name')} refers to unknown setting {threshold}, choose from {', '.join(THRESHOLD_SETTINGS)}")
+            threshold_settings[i] = threshold
+            raider = dict(raider, re_bgs_threshold=0)
+        raiders.append(raider)
+    return Scenario(config.get('name', os.path.basename(path)), config['players'], config['challenge_mode'], overrides, raiders, threshold_settings)
+
+# Compiled scenarios by content hash, so repeated loads in one run skip the cache folder too.
+compiled_scenarios = {}
+
+# Loads a scenario file. The compiled Scenario is cached in SCENARIO_CACHE_DIR under the hash of the file's content,
+# the gear values and the scenario format, so unchanged files skip parsing, gear lookups and Tekton's scaling.
+def load_scenario(path):
+    with open(path, 'rb') as f:
+        content = f.read()
+    key = hashlib.sha256(content + repr((SCENARIO_FORMAT, ACCURACY_MAX_VALUES)).encode()).hexdigest()
+    if key in compiled_scenarios:
+        return compiled_scenarios[key]
+    cache_path = os.path.join(SCENARIO_CACHE_DIR, f'{key}.pickle')
+    try:
+        with open(cache_path, 'rb') as f:
+            scenario = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        scenario = parse_scenario(path, content)
+        os.makedirs(SCENARIO_CACHE_DIR, exist_ok=True)
+        with open(cache_path + '.tmp', 'wb') as f:
+            pickle.dump(scenario, f)
+        os.replace(cache_path + '.tmp', cache_path)
+    compiled_scenarios[key] = scenario
+    return scenario
+
+# Returns reset copies of a team's Raiders. killTekton resets Raiders in place, so engines that read a Raider's state
+# use these to start from the beginning, however far the Raiders got in the last kill.
+def reset_team(team):
+    team = [copy.copy(r) for r in team]
+    for r in team:
+        r.reset()
+    return team
+
+# Class to hold a Tekton and a team that are reused across kills. The template keeps the team in createTeam order,
+# team is the same Raiders sorted by pid for the current kill.
+class KillState:
+    __slots__ = ('tekton', 'template', 'team')
+
+    def __init__(self, team=None):
+        self.tekton = Tekton(hitpoints, defence, maxhit)
+        # The pids createTeam rolls are replaced on every reset, so put the random state back afterwards.
+        random_state = random.getstate()
+        self.template = tuple(team or createTeam())
+        random.setstate(random_state)
+        self.team = list(self.template)
+
+    # Resets Tekton and every Raider in place and rolls new pids, like a fresh createTeam would.
+    def reset(self, rng=random):
+        self.tekton.reset()
+        for r in self.template:
+            r.reset()
+            r.pid = rng.randint(0,2000)
+        # Sort by pid to simulate actual game behaviour, ties keep the template order
+        self.team[:] = self.template
+        self.team.sort(key=lambda r: r.pid)
+        return self.tekton, self.team
+
+# Builds the KillState reused by killTekton.
+@functools.lru_cache(maxsize=1)
+def build_kill_state(scenario, challenge_mode, number_of_players, cross_rebgs_threshold, telegrab_rebgs_threshold, hitpoints, defence, maxhit):
+    return KillState()
+
+# Returns the KillState reused by killTekton, it is rebuilt whenever one of the settings the team depends on changes.
+def kill_state():
+    return build_kill_state(SCENARIO, CHALLENGE_MODE, NUMBER_OF_PLAYERS, CROSS_REBGS_THRESHOLD, TELEGRAB_REBGS_THRESHOLD, hitpoints, defence, maxhit)
+
+# Checks if any Raider still has a spec left that can lower Tekton's defence.
+def can_lower_defence(team):
+    for r in team:
+        if r.energy >= 50 and ((not r.hasSpecced and r.specwep in ['maul', 'bgs']) or r.re_bgs_threshold > 0):
+            return True
+    return False
+
+# Simulates a Tekton kill. Pass a KillState to reuse it, otherwise the shared one from kill_state is used.
+# rng rolls the pids, every Raider rolls their own attacks from their rng.
+# Set early_exit to stop as soon as the raid is certain to be left: a kill can no longer land before CUTOFF_TICK, or
+# Tekton's defence is above DEF_LEAVE_THRESHOLD with no specs left. Those raids come back with ticks of at least
+# CUTOFF_TICK or their stuck defence, so they still count as left, and the kept kills are unchanged.
+def killTekton(state=None, rng=random, early_exit=False):
+    tekton, team = (state or kill_state()).reset(rng)
     ticks = 0
     # Overkill not entirely accurate, as Venge is always applied ASAP without missing.
     overkill = False
-    # Sort by pid to simulate actual game behaviour
-    team.sort(key=lambda r: r.pid)
     while tekton.hp > 0:
+        tekton.tick = ticks
+        if early_exit:
+            if ticks + 1 >= CUTOFF_TICK:
+                return CUTOFF_TICK, tekton.defence, False
+            if tekton.defence > DEF_LEAVE_THRESHOLD and not can_lower_defence(team):
+                return ticks, tekton.defence, False
         #print(f"tick: {ticks}")
         # Check Tekton's defence for potential re-bgs
         re_bgs_defence = tekton.defence
@@ -648,92 +973,2056 @@ def killTekton():
             break
     return ticks, tekton.defence, overkill
 
-# Converts ticks to seconds.        
+# Spec weapon codes used by the batch engine.
+SPEC_NONE = 0
+SPEC_MAUL = 1
+SPEC_BGS = 2
+
+# Vectorized version of sim_acc for an array of Tekton defence values.
+def sim_acc_batch(defence, style, maxAttRoll):
+    maxDefRoll = (9 + defence) * (64 + style)
+    hit_above = 1 - (maxDefRoll + 2) / (2 * (maxAttRoll + 1))
+    hit_below = maxAttRoll / (2 * (maxDefRoll + 1))
+    return np.where(maxAttRoll > maxDefRoll, hit_above, hit_below)
+
+# Kinds of draws in the batch engine's random streams, see counter_uniforms.
+DRAW_PID = 0
+DRAW_ATTACK = 1
+DRAW_THRALL = 2
+DRAW_VENGE = 3
+
+# Returns uniform draws in [0, 1) that only depend on key and the (raid, raider, kind, count) of every draw, like a
+# counter-based generator such as Philox: raider is the team index from createTeam and count numbers that raider's
+# draws of that kind in the raid. Runs that share a key give every raider the same rolls for their nth attack, thrall
+# hit and venge, whatever happens in other raids or to other raiders, which couples runs that share a seed tightly.
+# The counter is spread over the bits of a 64-bit integer and mixed with the SplitMix64 finalizer.
+def counter_uniforms(key, raid, raider, kind, count):
+    x = (raid.astype(np.uint64) << 32) | (raider.astype(np.uint64) << 24) | np.uint64(kind << 20) | count.astype(np.uint64)
+    x = x * np.uint64(0x9E3779B97F4A7C15) + key
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return (x >> np.uint64(11)) * 2.0 ** -53
+
+# Vectorized version of do_scythe. Returns the damage dealt by each scythe swing for the uniform draws in u.
+# members holds the team index of every attacker and keys the (style, maxAttRoll, maxHit) of every team member.
+def do_scythe_batch(u, defence, members, keys):
+    return sample_tables(u, scythe_table, defence, members, keys)[0]
+
+# Vectorized version of do_maul. Returns the damage dealt, Tekton's new defence and the likelihood ratio of every maul.
+# keys holds the (initial_defence, maxAttRoll, maxHit) of every team member.
+def do_maul_batch(u, defence, members, keys, tilt=None):
+    return sample_tables(u, maul_table, defence, members, keys, tilt)
+
+# Vectorized version of do_bgs. Returns the damage dealt, Tekton's new defence and the likelihood ratio of every bgs.
+# keys holds the (maxAttRoll, maxHit) of every team member.
+def do_bgs_batch(u, defence, members, keys, tilt=None):
+    return sample_tables(u, bgs_table, defence, members, keys, tilt)
+
+# Vectorized version of do_claw. Returns the damage dealt by each claw spec.
+# keys holds the (maxAttRoll, maxHit) of every team member.
+def do_claw_batch(u, defence, members, keys):
+    return sample_tables(u, claw_table, defence, members, keys)[0]
+
+# Simulates a batch of Tekton kills in lockstep, one tick at a time. Returns arrays of ticks, final defence and overkill.
+# Set tilt to draw the maul and bgs specs from tilted tables (see DamageTable.tilted), the likelihood ratio of every
+# kill is then returned as a fourth array. Set early_exit to stop raids that are certain to be left, like killTekton.
+# rng only picks the key of the batch's streams, every roll comes from counter_uniforms. The raids are numbered from
+# first_raid in those streams, so a batch can pick up where an earlier one on the same key stopped.
+def sim_batch(n, rng, team, tilt=None, early_exit=False, first_raid=0):
+    team = reset_team(team)
+    k = len(team)
+    key = rng.integers(0, 2 ** 64, dtype=np.uint64)
+    raids = np.arange(first_raid, first_raid + n)
+    # Sort every raid's team by freshly rolled pids, like killTekton does.
+    pids = (counter_uniforms(key, raids[:, None], np.arange(k)[None, :], DRAW_PID, np.zeros((1, 1), dtype=np.int64)) * 2001).astype(np.int64)
+    order = np.argsort(pids, axis=1, kind='stable')
+
+    def per_raid(values, dtype=np.int64):
+        return np.asarray(values, dtype=dtype)[order]
+
+    spec_values = [r.loadout.spec or (0, 0) for r in team]
+    claw_values = [r.loadout.claws or (0, 0) for r in team]
+    # Damage table arguments per team member.
+    scythe_keys = [(r.loadout.style, *r.loadout.scythe) for r in team]
+    maul_keys = [(defence, *spec) for spec in spec_values]
+
+    # Static loadout per raid and team position.
+    member = order
+    spec_kind = per_raid([{'maul': SPEC_MAUL, 'bgs': SPEC_BGS}.get(r.specwep, SPEC_NONE) for r in team])
+    has_claws = per_raid([r.claws for r in team], bool)
+    has_thrall = per_raid([r.thrall for r in team], bool)
+    thrall_tier = per_raid([r.thrallTier for r in team])
+    re_bgs_threshold = per_raid([r.re_bgs_threshold for r in team])
+
+    # Mutable state per raid and team position.
+    cooldown = per_raid([r.cooldown for r in team])
+    energy = per_raid([r.energy for r in team])
+    has_specced = per_raid([r.hasSpecced for r in team], bool)
+    start_with_scythe = per_raid([r.start_with_scythe for r in team], bool)
+    thrall_cooldown = per_raid([r.thrallCooldown for r in team])
+    venge_amount = per_raid([r.vengeAmount for r in team])
+    raider_hp = per_raid([r.hp for r in team])
+    melee_pray = per_raid([r.meleePray for r in team], bool)
+    # Draws so far per raid, team position and kind of draw.
+    draws = np.zeros((n, k, 4), dtype=np.int64)
+
+    # Returns the next draw of kind for the raids in ids at team position j.
+    def next_uniforms(ids, j, kind):
+        u = counter_uniforms(key, raids[ids], member[ids, j], kind, draws[ids, j, kind])
+        draws[ids, j, kind] += 1
+        return u
+
+    tekton_hp = np.full(n, hitpoints, dtype=np.int64)
+    tekton_def = np.full(n, defence, dtype=np.int64)
+    ticks = np.zeros(n, dtype=np.int64)
+    overkill = np.zeros(n, dtype=bool)
+    weight = np.ones(n)
+    live = np.arange(n)
+    tick = 0
+
+    # Records the raids in ids that died this tick and drops them from the live set.
+    def finish(ids, is_overkill):
+        dead = ids[tekton_hp[ids] <= 0]
+        ticks[dead] = tick + 1
+        overkill[dead] = is_overkill
+        return live[tekton_hp[live] > 0]
+
+    while live.size:
+        if early_exit:
+            if tick + 1 >= CUTOFF_TICK:
+                ticks[live] = CUTOFF_TICK
+                break
+            stuck = live[tekton_def[live] > DEF_LEAVE_THRESHOLD]
+            can_spec = (energy[stuck] >= 50) & ((~has_specced[stuck] & (spec_kind[stuck] != SPEC_NONE)) | (re_bgs_threshold[stuck] > 0))
+            stuck = stuck[~can_spec.any(axis=1)]
+            if stuck.size:
+                ticks[stuck] = tick
+                live = np.setdiff1d(live, stuck, assume_unique=True)
+        re_bgs_defence = tekton_def.copy()
+        for j in range(k):
+            # Attacks
+            ready = cooldown[live, j] == 0
+            cooldown[live[~ready], j] -= 1
+            ids = live[ready]
+            if ids.size:
+                sws = start_with_scythe[ids, j]
+                can_spec = energy[ids, j] >= 50
+                spec = ~sws & ~has_specced[ids, j] & can_spec & (spec_kind[ids, j] != SPEC_NONE)
+                re_bgs = (~sws & ~spec & (re_bgs_threshold[ids, j] > 0) & (re_bgs_defence[ids] > re_bgs_threshold[ids, j])
+                          & can_spec & has_specced[ids, j])
+                claw = ~sws & ~spec & ~re_bgs & has_claws[ids, j] & can_spec
+                scythe = ~spec & ~re_bgs & ~claw
+                maul = spec & (spec_kind[ids, j] == SPEC_MAUL)
+                bgs = (spec & (spec_kind[ids, j] == SPEC_BGS)) | re_bgs
+
+                start_with_scythe[ids[sws], j] = False
+                has_specced[ids[spec | re_bgs], j] = True
+                energy[ids[spec | re_bgs | claw], j] -= 50
+                cooldown[ids, j] += np.select([scythe, claw], [4, 3], 5)
+
+                u = next_uniforms(ids, j, DRAW_ATTACK)
+                s = ids[scythe]
+                if s.size:
+                    tekton_hp[s] -= do_scythe_batch(u[scythe], tekton_def[s], member[s, j], scythe_keys)
+                m = ids[maul]
+                if m.size:
+                    damage, tekton_def[m], likelihood = do_maul_batch(u[maul], tekton_def[m], member[m, j], maul_keys, tilt)
+                    tekton_hp[m] -= damage
+                    weight[m] *= likelihood
+                b = ids[bgs]
+                if b.size:
+                    damage, tekton_def[b], likelihood = do_bgs_batch(u[bgs], tekton_def[b], member[b, j], spec_values, tilt)
+                    tekton_hp[b] -= damage
+                    weight[b] *= likelihood
+                c = ids[claw]
+                if c.size:
+                    tekton_hp[c] -= do_claw_batch(u[claw], tekton_def[c], member[c, j], claw_values)
+                live = finish(ids, True)
+
+            # Thralls
+            thrall_ids = live[has_thrall[live, j]]
+            ready = thrall_cooldown[thrall_ids, j] == 0
+            thrall_cooldown[thrall_ids[~ready], j] -= 1
+            ids = thrall_ids[ready]
+            if ids.size:
+                thrall_cooldown[ids, j] += 3
+                # Like sim_thrall, only tiers 1 to 3 hit.
+                tier = thrall_tier[ids, j]
+                hit = (next_uniforms(ids, j, DRAW_THRALL) * (tier + 1)).astype(np.int64)
+                tekton_hp[ids] -= np.where((tier >= 1) & (tier <= 3), hit, 0)
+                live = finish(ids, False)
+
+            # Venges
+            ids = live[venge_amount[live, j] > 0]
+            if ids.size:
+                # Turn on melee pray if tekton can kill you, don't take venge if it still can.
+                melee_pray[ids[raider_hp[ids, j] <= maxhit], j] = True
+                skip = raider_hp[ids, j] <= math.floor(maxhit / 2)
+                venge_amount[ids[skip], j] = 0
+                ids = ids[~skip]
+                if ids.size:
+                    high = np.where(melee_pray[ids, j], math.floor(maxhit / 2), maxhit)
+                    damage = 1 + (next_uniforms(ids, j, DRAW_VENGE) * high).astype(np.int64)
+                    raider_hp[ids, j] -= damage
+                    tekton_hp[ids] -= np.maximum(np.floor(damage * VENGE_DAMAGE_MULTIPLIER).astype(np.int64), 1)
+                    venge_amount[ids, j] -= 1
+                    live = finish(ids, False)
+
+            if not live.size:
+                break
+        tick += 1
+    if tilt:
+        return ticks, tekton_def, overkill, weight
+    return ticks, tekton_def, overkill
+
+# Simulates x Tekton kills with the batch engine. Returns arrays of ticks, final defence and overkill.
+def killTektonBatch(x, rng=None, early_exit=False):
+    if rng is None:
+        rng = np.random.default_rng()
+    team = createTeam()
+    results = [sim_batch(min(BATCH_SIZE, x - start), rng, team, early_exit=early_exit) for start in range(0, x, BATCH_SIZE)]
+    return tuple(np.concatenate(arrays) for arrays in zip(*results))
+
+# Columns of a Raider's row in KernelTeam.raiders, the state after Raider.reset followed by what the kernel needs
+# from its setup. Rows are copied for every kill and the first eight columns change during it, like the Raider.
+RAIDER_COOLDOWN = 0
+RAIDER_THRALL_COOLDOWN = 1
+RAIDER_HP = 2
+RAIDER_ENERGY = 3
+RAIDER_VENGES = 4
+RAIDER_MELEE_PRAY = 5
+RAIDER_START_WITH_SCYTHE = 6
+RAIDER_HAS_SPECCED = 7
+RAIDER_SPEC = 8
+RAIDER_CLAWS = 9
+RAIDER_THRALL = 10
+RAIDER_THRALL_TIER = 11
+RAIDER_RE_BGS_THRESHOLD = 12
+RAIDER_FIELDS = 13
+
+# Damage table kinds in KernelTeam.
+TABLE_SCYTHE = 0
+TABLE_CLAW = 1
+TABLE_MAUL = 2
+TABLE_BGS = 3
+
+# Advances a xoshiro128** state of four 32-bit words held in s and returns the next 32-bit output.
+# Every value stays below 2**43, so the same code runs on Python ints and on int64 arrays in Numba.
+def xoshiro_next(s):
+    x = (s[1] * 5) & 0xFFFFFFFF
+    result = ((((x << 7) | (x >> 25)) & 0xFFFFFFFF) * 9) & 0xFFFFFFFF
+    t = (s[1] << 9) & 0xFFFFFFFF
+    s[2] ^= s[0]
+    s[3] ^= s[1]
+    s[1] ^= s[2]
+    s[0] ^= s[3]
+    s[2] ^= t
+    s[3] = ((s[3] << 11) | (s[3] >> 21)) & 0xFFFFFFFF
+    return result
+
+# Returns a float in [0, 1) from two outputs, built like random.random() builds it from the Mersenne Twister.
+def xoshiro_random(s):
+    a = xoshiro_next(s) >> 5
+    b = xoshiro_next(s) >> 6
+    return (a * 67108864.0 + b) * (1.0 / 9007199254740992.0)
+
+# Returns an integer from a to b inclusive, by rejecting outputs cut to the bit length of the range.
+def xoshiro_randint(s, a, b):
+    n = b - a + 1
+    bits = 0
+    while n >> bits:
+        bits += 1
+    r = xoshiro_next(s) >> (32 - bits)
+    while r >= n:
+        r = xoshiro_next(s) >> (32 - bits)
+    return a + r
+
+# Returns the initial xoshiro128** state for a seed, as a list of four 32-bit words.
+def xoshiro_seed(seed=None):
+    state = np.random.SeedSequence(seed).generate_state(4).tolist()
+    # The all-zero state never leaves zero.
+    return state if any(state) else [1, 0, 0, 0]
+
+# Random stream that rolls the same xoshiro128** numbers as kill_kernel, so killTekton can be run on the exact
+# draws of a compiled kill.
+class Xoshiro128(random.Random):
+    def seed(self, a=None, version=2):
+        self.s = xoshiro_seed(a)
+
+    def getstate(self):
+        return tuple(self.s)
+
+    def setstate(self, state):
+        self.s = list(state)
+
+    def random(self):
+        return xoshiro_random(self.s)
+
+    def randint(self, a, b):
+        return xoshiro_randint(self.s, a, b)
+
+    def getrandbits(self, k):
+        if k <= 32:
+            return xoshiro_next(self.s) >> (32 - k)
+        return (self.getrandbits(k - 32) << 32) | xoshiro_next(self.s)
+
+# Class to hold a team as flat arrays for kill_kernel: a row of RAIDER_* columns per Raider in template order, and
+# the damage tables of every Raider by TABLE_* kind and Tekton defence, padded to the widest table. Tables a Raider
+# can't use are left empty.
+class KernelTeam:
+    __slots__ = ('raiders', 'cdf', 'damage', 'defence')
+
+    def __init__(self, state):
+        initial_defence = state.tekton.initial_defence
+        tables = []
+        self.raiders = np.zeros((len(state.template), RAIDER_FIELDS), dtype=np.int64)
+        for j, r in enumerate(reset_team(state.template)):
+            loadout = r.loadout
+            self.raiders[j, :RAIDER_SPEC] = [r.cooldown, r.thrallCooldown, r.hp, r.energy, r.vengeAmount, r.meleePray,
+                                             r.start_with_scythe, r.hasSpecced]
+            self.raiders[j, RAIDER_SPEC:] = [{'maul': SPEC_MAUL, 'bgs': SPEC_BGS}.get(r.specwep, SPEC_NONE), bool(r.claws),
+                                             r.thrall, r.thrallTier, r.re_bgs_threshold]
+            defences = range(initial_defence + 1)
+            tables.append([
+                [scythe_table(d, loadout.style, *loadout.scythe) for d in defences],
+                [claw_table(d, *loadout.claws) for d in defences] if loadout.claws else [],
+                [maul_table(d, initial_defence, *loadout.spec) for d in defences] if r.specwep == 'maul' else [],
+                [bgs_table(d, *loadout.spec) for d in defences] if loadout.spec else [],
+            ])
+        width = max(len(t.cdf) for kinds in tables for kind in kinds for t in kind)
+        shape = (len(tables), 4, initial_defence + 1, width)
+        self.cdf = np.ones(shape)
+        self.damage = np.zeros(shape, dtype=np.int64)
+        self.defence = np.zeros(shape, dtype=np.int64)
+        for j, kinds in enumerate(tables):
+            for kind, by_defence in enumerate(kinds):
+                for d, t in enumerate(by_defence):
+                    self.cdf[j, kind, d, :len(t.cdf)] = t.cdf
+                    self.damage[j, kind, d, :len(t.cdf)] = t.damage
+                    self.defence[j, kind, d, :len(t.cdf)] = t.defence
+
+# Builds the KernelTeam for a KillState, the shared one is kept while kill_state returns the same state.
+@functools.lru_cache(maxsize=1)
+def kernel_team(state):
+    return KernelTeam(state)
+
+# Draws the damage and Tekton's new defence from one of Raider j's tables at defence d, like DamageTable.sample.
+def kernel_draw(s, cdf, damage, new_defence, j, kind, d):
+    u = xoshiro_random(s)
+    low = 0
+    high = cdf.shape[3]
+    while low < high:
+        mid = (low + high) // 2
+        if u < cdf[j, kind, d, mid]:
+            high = mid
+        else:
+            low = mid + 1
+    return damage[j, kind, d, low], new_defence[j, kind, d, low]
+
+# Checks if any Raider still has a spec left that can lower Tekton's defence, like can_lower_defence.
+def kernel_can_lower_defence(raiders):
+    for j in range(raiders.shape[0]):
+        if raiders[j, RAIDER_ENERGY] >= 50 and ((raiders[j, RAIDER_HAS_SPECCED] == 0 and raiders[j, RAIDER_SPEC] != SPEC_NONE)
+                                                 or raiders[j, RAIDER_RE_BGS_THRESHOLD] > 0):
+            return True
+    return False
+
+# Simulates one kill like killTekton, on the Raider rows in raiders. order holds the rows in pid order.
+def kernel_kill(s, raiders, order, cdf, damage, new_defence, hitpoints, defence, maxhit, cutoff_tick, def_leave_threshold, early_exit):
+    tekton_hp = hitpoints
+    tekton_def = defence
+    ticks = 0
+    overkill = False
+    while tekton_hp > 0:
+        if early_exit:
+            if ticks + 1 >= cutoff_tick:
+                return cutoff_tick, tekton_def, False
+            if tekton_def > def_leave_threshold and not kernel_can_lower_defence(raiders):
+                return ticks, tekton_def, False
+        re_bgs_defence = tekton_def
+        for j in order:
+            r = raiders[j]
+            # Attacks, in the order of Raider.attack.
+            if r[RAIDER_COOLDOWN] == 0:
+                re_bgs = (r[RAIDER_RE_BGS_THRESHOLD] > 0 and re_bgs_defence > r[RAIDER_RE_BGS_THRESHOLD] and r[RAIDER_ENERGY] >= 50
+                          and r[RAIDER_HAS_SPECCED] != 0)
+                if r[RAIDER_START_WITH_SCYTHE] != 0:
+                    r[RAIDER_COOLDOWN] += 4
+                    hit, _ = kernel_draw(s, cdf, damage, new_defence, j, TABLE_SCYTHE, tekton_def)
+                    r[RAIDER_START_WITH_SCYTHE] = 0
+                elif r[RAIDER_HAS_SPECCED] == 0 and r[RAIDER_ENERGY] >= 50 and r[RAIDER_SPEC] != SPEC_NONE:
+                    r[RAIDER_ENERGY] -= 50
+                    r[RAIDER_HAS_SPECCED] = 1
+                    r[RAIDER_COOLDOWN] += 5
+                    kind = TABLE_MAUL if r[RAIDER_SPEC] == SPEC_MAUL else TABLE_BGS
+                    hit, tekton_def = kernel_draw(s, cdf, damage, new_defence, j, kind, tekton_def)
+                elif re_bgs:
+                    r[RAIDER_ENERGY] -= 50
+                    r[RAIDER_HAS_SPECCED] = 1
+                    r[RAIDER_COOLDOWN] += 5
+                    hit, tekton_def = kernel_draw(s, cdf, damage, new_defence, j, TABLE_BGS, tekton_def)
+                elif r[RAIDER_CLAWS] != 0 and r[RAIDER_ENERGY] >= 50:
+                    r[RAIDER_COOLDOWN] += 3
+                    r[RAIDER_ENERGY] -= 50
+                    hit, _ = kernel_draw(s, cdf, damage, new_defence, j, TABLE_CLAW, tekton_def)
+                else:
+                    r[RAIDER_COOLDOWN] += 4
+                    hit, _ = kernel_draw(s, cdf, damage, new_defence, j, TABLE_SCYTHE, tekton_def)
+                tekton_hp -= hit
+                if tekton_hp <= 0:
+                    overkill = True
+                    break
+            else:
+                r[RAIDER_COOLDOWN] -= 1
+
+            # Thralls
+            if r[RAIDER_THRALL] != 0:
+                if r[RAIDER_THRALL_COOLDOWN] == 0:
+                    r[RAIDER_THRALL_COOLDOWN] += 3
+                    if 1 <= r[RAIDER_THRALL_TIER] <= 3:
+                        tekton_hp -= xoshiro_randint(s, 0, r[RAIDER_THRALL_TIER])
+                    if tekton_hp <= 0:
+                        overkill = False
+                        break
+                else:
+                    r[RAIDER_THRALL_COOLDOWN] -= 1
+
+            # Venges
+            if r[RAIDER_VENGES] > 0:
+                if r[RAIDER_HP] <= maxhit:
+                    r[RAIDER_MELEE_PRAY] = 1
+                if r[RAIDER_HP] <= maxhit // 2:
+                    r[RAIDER_VENGES] = 0
+                else:
+                    hit = xoshiro_randint(s, 1, maxhit // 2 if r[RAIDER_MELEE_PRAY] != 0 else maxhit)
+                    r[RAIDER_HP] -= hit
+                    tekton_hp -= max(math.floor(hit * VENGE_DAMAGE_MULTIPLIER), 1)
+                    r[RAIDER_VENGES] -= 1
+                    if tekton_hp <= 0:
+                        overkill = False
+                        break
+        ticks += 1
+    return ticks, tekton_def, overkill
+
+# Simulates x kills of team into the ticks, final_defence and overkill arrays, rolling everything from the
+# xoshiro128** state s in the same order killTekton rolls it. compiled_kill_kernel compiles it with Numba, it and the
+# kernel_* and xoshiro_* functions it calls run as plain Python too.
+def kill_kernel(x, s, team_raiders, cdf, damage, new_defence, hitpoints, defence, maxhit, cutoff_tick, def_leave_threshold, early_exit,
+                ticks, final_defence, overkill):
+    k = team_raiders.shape[0]
+    raiders = np.empty_like(team_raiders)
+    pids = np.empty(k, dtype=np.int64)
+    for i in range(x):
+        raiders[:] = team_raiders
+        for j in range(k):
+            pids[j] = xoshiro_randint(s, 0, 2000)
+        # Sort by pid to simulate actual game behaviour, ties keep the template order
+        order = np.argsort(pids, kind='mergesort')
+        ticks[i], final_defence[i], overkill[i] = kernel_kill(s, raiders, order, cdf, damage, new_defence, hitpoints, defence, maxhit,
+                                                              cutoff_tick, def_leave_threshold, early_exit)
+
+# Returns kill_kernel compiled with Numba, or None when Numba isn't installed. Numba is only imported on the first call,
+# so importing the simulator doesn't pay for it.
+@functools.cache
+def compiled_kill_kernel():
+    try:
+        import numba
+        from numba.extending import register_jitable
+    except ImportError:
+        return None
+    for helper in [xoshiro_next, xoshiro_random, xoshiro_randint, kernel_draw, kernel_can_lower_defence, kernel_kill]:
+        register_jitable(helper)
+    return numba.njit(cache=True)(kill_kernel)
+
+# Runs x kills of a KillState through kernel, starting from the xoshiro128** state s. Returns arrays of ticks,
+# final defence and overkill.
+def run_kernel(kernel, x, s, state, early_exit=False):
+    team = kernel_team(state)
+    tekton = state.tekton
+    ticks = np.zeros(x, dtype=np.int64)
+    final_defence = np.zeros(x, dtype=np.int64)
+    overkill = np.zeros(x, dtype=bool)
+    kernel(x, s, team.raiders, team.cdf, team.damage, team.defence, tekton.initial_hp, tekton.initial_defence, tekton.maxhit,
+           CUTOFF_TICK, DEF_LEAVE_THRESHOLD, early_exit, ticks, final_defence, overkill)
+    return ticks, final_defence, overkill
+
+# Simulates x Tekton kills with the tick loop compiled by Numba. Returns arrays of ticks, final defence and overkill
+# like killTektonBatch. Without Numba it falls back to killTekton, rolling from a random.Random seeded with seed, so
+# the same seed gives different kills with and without Numba.
+def killTektonCompiled(x, seed=None, early_exit=False, team=None):
+    state = kill_state() if team is None else KillState(team)
+    kernel = compiled_kill_kernel()
+    if kernel is not None:
+        return run_kernel(kernel, x, np.array(xoshiro_seed(seed), dtype=np.int64), state, early_exit)
+    stream = random.Random(seed)
+    for r in state.template:
+        r.rng = stream
+    try:
+        kills = np.array([killTekton(state, stream, early_exit) for i in range(x)], dtype=np.int64).reshape(x, 3)
+    finally:
+        for r in state.template:
+            r.rng = random
+    return kills[:, 0], kills[:, 1], kills[:, 2].astype(bool)
+
+# Checks that the kernel simulates exactly the kills killTekton does: both run x kills from the same xoshiro128**
+# seed, killTekton through an Xoshiro128 stream. Set compiled to False to check the plain Python kernel, which
+# doesn't need Numba. Returns the number of kills that differ.
+def check_parity(x=10000, seed=None, early_exit=False, compiled=True):
+    kernel = compiled_kill_kernel() if compiled else kill_kernel
+    if kernel is None:
+        raise RuntimeError("Numba isn't installed, run check_parity with compiled=False to check the plain Python kernel")
+    seed = np.random.SeedSequence(seed).entropy
+    state = KillState()
+    kernel_kills = np.stack(run_kernel(kernel, x, np.array(xoshiro_seed(seed), dtype=np.int64),
+                                       state, early_exit), axis=1)
+    stream = Xoshiro128(seed)
+    for r in state.template:
+        r.rng = stream
+    try:
+        kills = np.array([killTekton(state, stream, early_exit) for i in range(x)], dtype=np.int64).reshape(x, 3)
+    finally:
+        for r in state.template:
+            r.rng = random
+    return int((kernel_kills != kills).any(axis=1).sum())
+
+# Runs check_parity on every supported team size in normal and challenge mode, with and without early exit.
+# Returns a row per combination with the number of kills that differ.
+def parity_suite(x=2000, seed=None, compiled=True):
+    rows = []
+    for num_players, challenge_mode, early_exit in itertools.product(SUPPORTED_PLAYERS, (False, True), (False, True)):
+        with settings(**scale_settings(num_players, challenge_mode)):
+            mismatches = check_parity(x, seed, early_exit, compiled)
+        rows.append({'players': num_players, 'challenge_mode': challenge_mode, 'early_exit': early_exit, 'mismatches': mismatches})
+        print(f"{num_players} {'CM' if challenge_mode else 'normal':<6} {'early exit' if early_exit else '':<10} {mismatches} of {x} kills differ")
+    return rows
+
+# Times the scalar engine against the compiled one of benchmark_engines on x kills and prints the time per simulated
+# raid and the speedup. The first compiled call also compiles the kernel, or loads it from Numba's cache, and is timed separately.
+def benchmark_compiled(x=100000, seed=None, early_exit=False):
+    if compiled_kill_kernel() is None:
+        raise RuntimeError("Numba isn't installed, killTektonCompiled runs killTekton")
+    suffix = ' early exit' if early_exit else ''
+    start = time.perf_counter()
+    benchmark_engines(1, seed)['compiled' + suffix]()
+    compile_seconds = time.perf_counter() - start
+    engines = benchmark_engines(x, seed)
+    start = time.perf_counter()
+    engines['scalar' + suffix]()
+    scalar = (time.perf_counter() - start) / x
+    start = time.perf_counter()
+    engines['compiled' + suffix]()
+    compiled = (time.perf_counter() - start) / x
+    print(f"Compiling took {compile_seconds:.2f}s")
+    print(f"{'scalar':<10} {scalar * 1e6:>8.2f} µs/raid")
+    print(f"{'compiled':<10} {compiled * 1e6:>8.2f} µs/raid, {scalar / compiled:.1f}x faster")
+    return {'compile_seconds': compile_seconds, 'scalar': scalar, 'compiled': compiled, 'speedup': scalar / compiled}
+
+# Checks which kills would have been stayed for, the rest count as left raids.
+def raid_kept(ticks, defence):
+    return (defence <= DEF_LEAVE_THRESHOLD) & (ticks < CUTOFF_TICK)
+
+# Class to compute room time statistics straight from the counts of each distinct room time, in one pass over a few
+# dozen values instead of one over every kill. labels are the room times in seconds, counts the kept kills for each
+# and simulations the number of raids including the left ones. Statistics of the kept kills are nan if none were kept.
+class RoomTimeStats:
+    def __init__(self, labels, counts, simulations):
+        self.labels = labels
+        self.counts = counts
+        self.simulations = simulations
+        self.kept = counts.sum()
+        self.cumulative = np.cumsum(counts)
+
+    def mean(self):
+        if not self.kept:
+            return math.nan
+        return float((self.labels * self.counts).sum() / self.kept)
+
+    # Returns the sample variance of the room times of the kept kills. Histograms of exact chances from solve_exact
+    # hold probabilities instead of counts, their variance needs no sample correction.
+    def variance(self):
+        correction = 1 if np.issubdtype(self.counts.dtype, np.integer) else 0
+        if self.kept <= correction:
+            return math.nan
+        return float(((self.labels - self.mean()) ** 2 * self.counts).sum() / (self.kept - correction))
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+    # Returns the most common room time, the fastest one on ties.
+    def mode(self):
+        if not self.kept:
+            return math.nan
+        return float(self.labels[self.counts.argmax()])
+
+    # Returns the room time below which q percent of the kept kills fall.
+    def percentile(self, q):
+        if not self.kept:
+            return math.nan
+        return float(self.labels[np.searchsorted(self.cumulative, q / 100 * self.kept)])
+
+    # Returns the share of kept kills with a room time of at most seconds.
+    def cdf(self, seconds):
+        i = np.searchsorted(self.labels, seconds, side='right')
+        return float(self.cumulative[i - 1] / self.kept) if i else 0.0 if self.kept else math.nan
+
+    # Returns the percentage of all raids, left ones included, that were kept with a room time of at most seconds.
+    def run_rate(self, seconds=None):
+        i = np.searchsorted(self.labels, RUNABLE_TIME if seconds is None else seconds, side='right')
+        return float(self.cumulative[i - 1] / self.simulations * 100) if i else 0.0
+
+# Class to fold kills straight into counts indexed by (ticks, overkill), so memory doesn't grow with the number of simulations.
+class KillHistogram:
+    def __init__(self):
+        self.counts = np.zeros((CUTOFF_TICK + 1, 2), dtype=np.int64)
+        self.simulations = 0
+        self.raids_left = 0
+        self.zero_def_count = 0
+
+    # Makes room for kills up to the given tick, only needed when raids aren't left at CUTOFF_TICK.
+    def grow(self, ticks):
+        if ticks >= len(self.counts):
+            self.counts = np.vstack([self.counts, np.zeros((ticks + 1 - len(self.counts), 2), dtype=np.int64)])
+
+    # Adds a single kill from killTekton.
+    def add(self, ticks, defence, overkill):
+        self.simulations += 1
+        if defence > DEF_LEAVE_THRESHOLD or ticks >= CUTOFF_TICK:
+            self.raids_left += 1
+            return
+        if defence <= 0:
+            self.zero_def_count += 1
+        self.grow(ticks)
+        self.counts[ticks, int(overkill)] += 1
+
+    # Adds arrays of kills from the batch engine.
+    def add_batch(self, ticks, defence, overkill):
+        kept = raid_kept(ticks, defence)
+        self.simulations += len(ticks)
+        self.raids_left += int((~kept).sum())
+        self.zero_def_count += int((kept & (defence <= 0)).sum())
+        if kept.any():
+            self.grow(int(ticks[kept].max()))
+            np.add.at(self.counts, (ticks[kept], overkill[kept].astype(np.int64)), 1)
+
+    # Adds the counts of another histogram to this one.
+    def merge(self, other):
+        self.grow(len(other.counts) - 1)
+        self.counts[:len(other.counts)] += other.counts
+        self.simulations += other.simulations
+        self.raids_left += other.raids_left
+        self.zero_def_count += other.zero_def_count
+        return self
+
+    # Returns the distinct room times in seconds with the number of kills for each.
+    def room_times(self):
+        seconds = room_time_table(len(self.counts))[:len(self.counts)]
+        labels, inverse = np.unique(seconds, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=self.counts.ravel(), minlength=len(labels)).astype(self.counts.dtype)
+        return labels[counts > 0], counts[counts > 0]
+
+    # Returns the RoomTimeStats of the kept kills, fetch it once when several statistics are needed.
+    def stats(self):
+        return RoomTimeStats(*self.room_times(), self.simulations)
+
+    def mean(self):
+        return self.stats().mean()
+
+    def mode(self):
+        return self.stats().mode()
+
+    def percentile(self, q):
+        return self.stats().percentile(q)
+
+    def run_rate(self):
+        return self.stats().run_rate()
+
+    def leave_rate(self):
+        return self.raids_left / self.simulations * 100
+
+    def zero_def_rate(self):
+        return self.zero_def_count / self.simulations * 100
+
+    # Returns the half-widths of the confidence intervals of run_rate and leave_rate in percentage points, and of mean
+    # in seconds, using the normal approximation.
+    def half_widths(self, confidence=0.95):
+        z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        n = self.simulations
+        stats = self.stats()
+        run = stats.run_rate() / 100
+        leave = self.leave_rate() / 100
+        if stats.kept > 1:
+            mean_half_width = z * math.sqrt(stats.variance() / stats.kept)
+        else:
+            mean_half_width = math.inf
+        return {
+            'run_rate': z * math.sqrt(run * (1 - run) / n) * 100,
+            'leave_rate': z * math.sqrt(leave * (1 - leave) / n) * 100,
+            'mean': mean_half_width,
+        }
+
+# Simulates x Tekton kills with the batch engine, folding every batch into a histogram. Uses createTeam unless a team is given.
+def sim_histogram(x, rng=None, early_exit=False, team=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    team = team or createTeam()
+    histogram = KillHistogram()
+    for start in range(0, x, BATCH_SIZE):
+        histogram.add_batch(*sim_batch(min(BATCH_SIZE, x - start), rng, team, early_exit=early_exit))
+    return histogram
+
+# Simulates batches of kills until the confidence intervals of the run and leave rate are within rate_half_width
+# percentage points and the one of the mean room time within mean_half_width seconds, or max_simulations is reached.
+# Set batch_size lower for cheap configurations, the targets are only checked between batches.
+def sim_until(rate_half_width=0.1, mean_half_width=0.01, confidence=0.95, max_simulations=10000000, batch_size=None, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    batch_size = batch_size or BATCH_SIZE
+    team = createTeam()
+    histogram = KillHistogram()
+    while histogram.simulations < max_simulations:
+        histogram.add_batch(*sim_batch(min(batch_size, max_simulations - histogram.simulations), rng, team))
+        half_widths = histogram.half_widths(confidence)
+        if max(half_widths['run_rate'], half_widths['leave_rate']) <= rate_half_width and half_widths['mean'] <= mean_half_width:
+            break
+    return histogram
+
+# Prints the number of simulations and the confidence intervals of the run rate, leave rate and mean room time.
+def print_confidence(histogram, confidence=0.95):
+    half_widths = histogram.half_widths(confidence)
+    print(f"{histogram.simulations} simulations, {confidence:.0%} confidence intervals:")
+    print(f"Runable: {histogram.run_rate():.2f}% \u00b1 {half_widths['run_rate']:.2f}")
+    print(f"Raids left: {histogram.leave_rate():.2f}% \u00b1 {half_widths['leave_rate']:.2f}")
+    print(f"Mean: {histogram.mean():.3f}s \u00b1 {half_widths['mean']:.3f}")
+
+# Estimates the leave and zero defence rates with importance sampling, for setups where these are too rare for plain
+# simulations. With towards='leave' the maul and bgs specs miss more often, with towards='zero_def' they hit more often.
+# bias is the share of spec rolls forced towards that outcome, every kill is reweighted by its likelihood ratio,
+# so both estimates stay unbiased whichever way the specs are pushed. Rates and half-widths are in percentages.
+def estimate_rare_events(x, towards='leave', bias=0.5, confidence=0.95, rng=None):
+    if towards not in ['leave', 'zero_def']:
+        raise ValueError(f"towards must be 'leave' or 'zero_def', got {towards!r}")
+    if rng is None:
+        rng = np.random.default_rng()
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    team = createTeam()
+    sums = np.zeros((2, 2))
+    weight_sum = weight_square_sum = 0.0
+    for start in range(0, x, BATCH_SIZE):
+        ticks, tekton_defence, _, weight = sim_batch(min(BATCH_SIZE, x - start), rng, team, (towards == 'leave', bias))
+        kept = raid_kept(ticks, tekton_defence)
+        for i, event in enumerate([~kept, kept & (tekton_defence <= 0)]):
+            sums[i] += (weight[event].sum(), (weight[event] ** 2).sum())
+        weight_sum += weight.sum()
+        weight_square_sum += (weight ** 2).sum()
+    estimates = sums[:, 0] / x
+    half_widths = z * np.sqrt(np.maximum(sums[:, 1] / x - estimates ** 2, 0) / x)
+    return {
+        'simulations': x,
+        # Number of plain simulations the weighted kills are worth.
+        'effective_simulations': float(weight_sum ** 2 / weight_square_sum),
+        'leave_rate': float(estimates[0] * 100),
+        'leave_rate_half_width': float(half_widths[0] * 100),
+        'zero_def_rate': float(estimates[1] * 100),
+        'zero_def_rate_half_width': float(half_widths[1] * 100),
+    }
+
+# Simulates one shard of raids on its own random stream and returns its histogram. overrides are the settings of the
+# process that sent the shard, see worker_settings.
+def sim_shard(x, seed, team=None, overrides=None):
+    with settings(**(overrides or {})):
+        return sim_histogram(x, np.random.default_rng(seed), team=team)
+
+# Splits x simulations over a pool of worker processes, each with an independent random stream spawned from seed.
+# The merged histogram is reproducible for a given seed and number of workers.
+def run_parallel(x, seed=None, workers=None):
+    workers = workers or os.cpu_count()
+    seed_sequence = np.random.SeedSequence(seed)
+    sizes = [x // workers + (i < x % workers) for i in range(workers)]
+    team = createTeam()
+    histogram = KillHistogram()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        shards = executor.map(sim_shard, sizes, seed_sequence.spawn(workers), itertools.repeat(team), itertools.repeat(worker_settings()))
+        for shard in shards:
+            histogram.merge(shard)
+    # Store the entropy so unseeded runs can be reproduced later.
+    histogram.seed = seed_sequence.entropy
+    return histogram
+
+# Temporarily overrides module settings, e.g. settings(CROSS_REBGS_THRESHOLD=60), and puts them back afterwards.
+@contextlib.contextmanager
+def settings(**overrides):
+    previous = {name: globals()[name] for name in overrides}
+    globals().update(overrides)
+    try:
+        yield
+    finally:
+        globals().update(previous)
+
+# Settings worker processes need from the process that started them. Workers started with spawn or forkserver import
+# the module afresh, so overrides from settings() and scenarios have to be sent along.
+WORKER_SETTINGS = SCENARIO_SETTINGS + ['SCENARIO', 'NUMBER_OF_PLAYERS', 'CHALLENGE_MODE', 'hitpoints', 'defence', 'initial_defence', 'maxhit',
+                                       'ENTRY_TICKS', 'DEATH_ANIM', 'OVERKILL_DEATH_ANIM', 'WALKBACK_TICK', 'WALKBACK_DEATH_ANIM', 'CRYSTAL_ANIM', 'BATCH_SIZE']
+
+# Returns the current values of WORKER_SETTINGS, to apply with settings() in a worker.
+def worker_settings():
+    return {name: globals()[name] for name in WORKER_SETTINGS}
+
+# Class to count every kill by (ticks, defence, overkill) before any raids are left, so the leave rules can be applied
+# afterwards. Changing DEF_LEAVE_THRESHOLD or CUTOFF_TICK then doesn't need new simulations.
+class KillTable:
+    def __init__(self):
+        self.counts = np.zeros((CUTOFF_TICK + 1, defence + 1, 2), dtype=np.int64)
+
+    # Makes room for kills up to the given tick.
+    def grow(self, ticks):
+        if ticks >= len(self.counts):
+            grown = np.zeros((ticks + 1,) + self.counts.shape[1:], dtype=np.int64)
+            grown[:len(self.counts)] = self.counts
+            self.counts = grown
+
+    # Adds arrays of kills from the batch engine.
+    def add_batch(self, ticks, defence, overkill):
+        self.grow(int(ticks.max()))
+        np.add.at(self.counts, (ticks, defence, overkill.astype(np.int64)), 1)
+
+    # Adds the counts of another table to this one.
+    def merge(self, other):
+        self.grow(len(other.counts) - 1)
+        self.counts[:len(other.counts)] += other.counts
+        return self
+
+    @property
+    def simulations(self):
+        return int(self.counts.sum())
+
+    # Returns the KillHistogram these kills give with the given leave rules, defaulting to the current settings.
+    def histogram(self, def_leave_threshold=None, cutoff_tick=None):
+        def_leave_threshold = DEF_LEAVE_THRESHOLD if def_leave_threshold is None else def_leave_threshold
+        cutoff_tick = CUTOFF_TICK if cutoff_tick is None else cutoff_tick
+        kept = self.counts[:max(cutoff_tick, 0), :max(def_leave_threshold + 1, 0)]
+        histogram = KillHistogram()
+        histogram.counts = kept.sum(axis=1)
+        histogram.simulations = self.simulations
+        histogram.raids_left = histogram.simulations - int(kept.sum())
+        histogram.zero_def_count = int(kept[:, :1].sum())
+        return histogram
+
+# Simulates x Tekton kills with the batch engine into a KillTable.
+def sim_table(x, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    team = createTeam()
+    table = KillTable()
+    for start in range(0, x, BATCH_SIZE):
+        table.add_batch(*sim_batch(min(BATCH_SIZE, x - start), rng, team))
+    return table
+
+# Hashes everything the kills of the current team depend on: the Raiders and their loadouts, Tekton's scaled stats and
+# the simulator version. The leave rules and room timing settings are left out, they're applied to the stored kills.
+def scenario_key():
+    # createTeam rolls pids, which shouldn't shift the random rolls of the kills that follow.
+    random_state = random.getstate()
+    team = createTeam()
+    random.setstate(random_state)
+    raiders = []
+    for r in team:
+        state = r.__getstate__()
+        state.pop('pid')
+        state['loadout'] = (r.loadout.spec, r.loadout.claws, r.loadout.scythe, int(r.loadout.style))
+        raiders.append(sorted(state.items()))
+    key = (SIMULATOR_VERSION, NUMBER_OF_PLAYERS, CHALLENGE_MODE, hitpoints, defence, maxhit, raiders)
+    return hashlib.sha256(repr(key).encode()).hexdigest()
+
+# Opens the result store, creating its table when needed.
+def open_store(path=None):
+    connection = sqlite3.connect(path or RESULT_STORE)
+    connection.execute('CREATE TABLE IF NOT EXISTS kills (scenario TEXT PRIMARY KEY, simulations INTEGER, top_ups INTEGER, entropy TEXT, counts BLOB)')
+    return connection
+
+# Returns the stored KillTable of the current team with at least x kills. Only the kills missing from the store are
+# simulated and merged in. Kill number i is raid i % STORE_BLOCK_SIZE of the stream of block i // STORE_BLOCK_SIZE,
+# spawned from the scenario's stored entropy, so a store grows the same way whatever the number of kills asked for
+# along the way.
+def stored_table(x, path=None):
+    key = scenario_key()
+    with contextlib.closing(open_store(path)) as connection:
+        row = connection.execute('SELECT simulations, top_ups, entropy, counts FROM kills WHERE scenario = ?', (key,)).fetchone()
+        table = KillTable()
+        if row:
+            simulations, top_ups, entropy, counts = row
+            table.counts = np.load(io.BytesIO(counts))
+            entropy = int(entropy)
+        else:
+            simulations, top_ups, entropy = 0, 0, np.random.SeedSequence().entropy
+        if simulations >= x:
+            return table
+        team = createTeam()
+        while simulations < x:
+            block, first_raid = divmod(simulations, STORE_BLOCK_SIZE)
+            n = min(STORE_BLOCK_SIZE - first_raid, BATCH_SIZE, x - simulations)
+            rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(block,)))
+            table.add_batch(*sim_batch(n, rng, team, first_raid=first_raid))
+            simulations += n
+        counts = io.BytesIO()
+        np.save(counts, table.counts)
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO kills VALUES (?, ?, ?, ?, ?)', (key, table.simulations, top_ups + 1, str(entropy), counts.getvalue()))
+    return table
+
+# Evaluates run rate, leave rate and mean room time for every combination of the given settings, x kills each.
+# Every re-bgs pair is simulated from the same seed, so differences between grid points aren't drowned in noise.
+# The leave thresholds and cutoff ticks only filter the kills of each re-bgs pair and don't add simulations.
+def sweep(x, cross_thresholds=None, telegrab_thresholds=None, def_leave_thresholds=None, cutoff_ticks=None, seed=None):
+    seed = np.random.SeedSequence(seed).entropy
+    rows = []
+    for cross, telegrab in itertools.product(cross_thresholds or [CROSS_REBGS_THRESHOLD], telegrab_thresholds or [TELEGRAB_REBGS_THRESHOLD]):
+        with settings(CROSS_REBGS_THRESHOLD=cross, TELEGRAB_REBGS_THRESHOLD=telegrab):
+            table = sim_table(x, np.random.default_rng(seed))
+        for leave, cutoff in itertools.product(def_leave_thresholds or [DEF_LEAVE_THRESHOLD], cutoff_ticks or [CUTOFF_TICK]):
+            histogram = table.histogram(leave, cutoff)
+            rows.append({
+                'cross_rebgs': cross,
+                'telegrab_rebgs': telegrab,
+                'def_leave': leave,
+                'cutoff_tick': cutoff,
+                'run_rate': histogram.run_rate(),
+                'leave_rate': histogram.leave_rate(),
+                'mean': histogram.mean() if histogram.counts.any() else float('nan'),
+            })
+    return rows
+
+# Prints the rows of a sweep as a table, best run rate first.
+def print_sweep(rows):
+    print(f"{'Cross':>6} {'TG':>4} {'Def':>4} {'Cutoff':>6} {'Runable':>8} {'Left':>7} {'Mean':>6}")
+    for row in sorted(rows, key=lambda row: -row['run_rate']):
+        print(f"{row['cross_rebgs']:>6} {row['telegrab_rebgs']:>4} {row['def_leave']:>4} {row['cutoff_tick']:>6} "
+              f"{row['run_rate']:>7.2f}% {row['leave_rate']:>6.2f}% {row['mean']:>6.2f}")
+
+# Random stream for a single Raider. With antithetic set every roll is mirrored, random() returns 1 - u and
+# randint(a, b) returns a + b - n, so a mirrored kill sees the opposite luck of the plain kill on the same seed.
+class MirrorRandom(random.Random):
+    antithetic = False
+
+    def random(self):
+        u = super().random()
+        # random() returns multiples of 2**-53 below 1, this keeps the mirrored draw in the same range.
+        return 1 - 2 ** -53 - u if self.antithetic else u
+
+    def randint(self, a, b):
+        n = super().randint(a, b)
+        return a + b - n if self.antithetic else n
+
+    # Overriding random() makes random.Random build randint on it, unless getrandbits is overridden too.
+    def getrandbits(self, k):
+        return super().getrandbits(k)
+
+# Compares two setups of the same size on x kills with common random numbers. Every kill of both setups starts every
+# Raider position on the same random stream, so the paired differences only show the effect of the setup change.
+# Set antithetic to also run every kill with mirrored rolls and average the pair.
+# Returns the differences a - b in run rate (percentage points) and mean room time (seconds) with their standard errors,
+# and the standard errors independent runs of the same size would have had.
+def compare(team_a, team_b, x, antithetic=False, seed=None):
+    if len(team_a) != len(team_b):
+        raise ValueError(f"Setups need the same number of Raiders to be compared, got {len(team_a)} and {len(team_b)}")
+    states = [KillState(team_a), KillState(team_b)]
+    streams = [MirrorRandom() for _ in range(len(team_a) + 1)]
+    passes = [False, True] if antithetic else [False]
+    seed = np.random.SeedSequence(seed).entropy
+    kills = np.zeros((3, x, len(passes), 2), dtype=np.int64)
+    try:
+        for state in states:
+            for r, stream in zip(state.template, streams):
+                r.rng = stream
+        for i in range(x):
+            for p, mirrored in enumerate(passes):
+                for s, state in enumerate(states):
+                    for j, stream in enumerate(streams):
+                        stream.seed(f'{seed}-{i}-{j}')
+                        stream.antithetic = mirrored
+                    kills[:, i, p, s] = killTekton(state, streams[-1])
+    finally:
+        for state in states:
+            for r in state.template:
+                r.rng = random
+    ticks, tekton_defence, overkill = kills
+    kept = raid_kept(ticks, tekton_defence)
+    seconds = room_seconds(ticks, overkill)
+    # Average the antithetic pairs first, every kill is then one independent sample per setup.
+    runable = (kept & (seconds <= RUNABLE_TIME)).mean(axis=1) * 100
+    kept_share = kept.mean(axis=1)
+    kept_seconds = (kept * seconds).mean(axis=1)
+    means = kept_seconds.sum(axis=0) / kept_share.sum(axis=0)
+    # Linearized mean room time per kill, the mean is a ratio of kept seconds over kept kills.
+    mean_terms = (kept_seconds - means * kept_share) / kept_share.mean(axis=0)
+    def standard_error(samples):
+        return float(samples.std(ddof=1) / math.sqrt(x))
+    return {
+        'run_rate': float(runable[:, 0].mean() - runable[:, 1].mean()),
+        'run_rate_se': standard_error(runable[:, 0] - runable[:, 1]),
+        'run_rate_independent_se': math.hypot(standard_error(runable[:, 0]), standard_error(runable[:, 1])),
+        'mean': float(means[0] - means[1]),
+        'mean_se': standard_error(mean_terms[:, 0] - mean_terms[:, 1]),
+        'mean_independent_se': math.hypot(standard_error(mean_terms[:, 0]), standard_error(mean_terms[:, 1])),
+    }
+
+# Prints the result of compare.
+def print_comparison(result):
+    print(f"Runable: {result['run_rate']:+.2f}% \u00b1 {result['run_rate_se']:.2f} (independent runs: \u00b1 {result['run_rate_independent_se']:.2f})")
+    print(f"Mean: {result['mean']:+.3f}s \u00b1 {result['mean_se']:.3f} (independent runs: \u00b1 {result['mean_independent_se']:.3f})")
+
+# Raider settings the optimizer may change.
+OPTIMIZER_FIELDS = ['specwep', 'claws', 'delay', 'vengeAmount', 'thrall', 'thrallTier', 'start_with_scythe', 're_bgs_threshold']
+
+# Returns a copy of Raider r with some of its settings changed, e.g. replace_raider(r, delay=1).
+def replace_raider(r, **changes):
+    unknown = [name for name in changes if name not in OPTIMIZER_FIELDS]
+    if unknown:
+        raise ValueError(f"Can't change {', '.join(unknown)} of {r.name}, choose from {', '.join(OPTIMIZER_FIELDS)}")
+    settings = {
+        'pid': r.pid, 'name': r.name, 'hp': r.initial_hp, 'armour': r.armour, 'specwep': r.specwep, 'claws': r.claws,
+        'amulet': r.amulet, 'ring': r.ring, 'boost': r.boost, 'energy': r.initial_energy, 'thrall': r.thrall,
+        'delay': r.delay, 'thrallTier': r.thrallTier, 'vengeAmount': r.initial_vengeAmount,
+        'meleePray': r.initial_meleePray, 're_bgs_threshold': r.re_bgs_threshold,
+        'start_with_scythe': r.initial_start_with_scythe,
+    }
+    return Raider(**dict(settings, **changes))
+
+# Lists every setup in the search space. options maps Raider names to the values to try per setting, e.g.
+# {'Cross': {'delay': [0, 1], 'start_with_scythe': [False, True]}}. Each setup is a tuple of (name, setting, value).
+def optimizer_candidates(options):
+    choices = [[(name, field, value) for value in values] for name, fields in options.items() for field, values in fields.items()]
+    return list(itertools.product(*choices))
+
+# Builds the team of a setup from createTeam.
+def candidate_team(candidate):
+    team = createTeam()
+    names = [r.name for r in team]
+    changes = defaultdict(dict)
+    for name, field, value in candidate:
+        if name not in names:
+            raise ValueError(f"The team has no Raider named {name}, choose from {', '.join(names)}")
+        changes[name][field] = value
+    return [replace_raider(r, **changes[r.name]) if r.name in changes else r for r in team]
+
+# Returns the score of a run rate or mean room time for optimize_team, higher is better. A mean without kept kills
+# counts as the worst score.
+def optimizer_score(value, objective):
+    if math.isnan(value):
+        return -math.inf
+    return value if objective == 'run_rate' else -value
+
+# Searches the setups in options (see optimizer_candidates) for the best run rate, or the lowest mean room time with
+# objective='mean', by successive halving. Every round simulates each remaining setup on samples more kills, on a
+# shared seed per round so setups are compared on common random numbers. Then only the best 1 in eta setups go on,
+# and any setup whose confidence interval lies entirely on the wrong side of the leader's is dropped right away.
+# The kills per setup grow eta times every round until one is left, or until max_simulations kills have been
+# simulated over all rounds and setups, the last round is cut short to stay within it. Setups are simulated in
+# parallel over workers. Returns every setup ranked, the ones that went furthest first, with their estimates and 95% confidence intervals.
+def optimize_team(options, objective='run_rate', samples=2000, eta=3, max_simulations=1000000, workers=None, seed=None):
+    if objective not in ['run_rate', 'mean']:
+        raise ValueError(f"objective must be 'run_rate' or 'mean', got {objective!r}")
+    candidates = optimizer_candidates(options)
+    teams = [candidate_team(candidate) for candidate in candidates]
+    histograms = [KillHistogram() for _ in candidates]
+    rounds = [0] * len(candidates)
+    remaining = list(range(len(candidates)))
+    seed_sequence = np.random.SeedSequence(seed)
+    overrides = worker_settings()
+    if samples * len(candidates) > max_simulations:
+        raise ValueError(f"max_simulations {max_simulations} can't cover a first round of {samples} kills for {len(candidates)} setups")
+    simulations = 0
+    round_number = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        while remaining:
+            samples = min(samples, (max_simulations - simulations) // len(remaining))
+            if samples <= 0:
+                break
+            round_seed = seed_sequence.spawn(1)[0]
+            shards = executor.map(sim_shard, itertools.repeat(samples), itertools.repeat(round_seed), [teams[i] for i in remaining],
+                                  itertools.repeat(overrides))
+            for i, shard in zip(remaining, shards):
+                histograms[i].merge(shard)
+                rounds[i] = round_number
+            simulations += samples * len(remaining)
+            if len(remaining) == 1:
+                break
+            scores = {i: optimizer_score(getattr(histograms[i], objective)(), objective) for i in remaining}
+            half_widths = {i: histograms[i].half_widths()[objective] for i in remaining}
+            leader = max(remaining, key=scores.get)
+            remaining = sorted(remaining, key=scores.get, reverse=True)[:max(1, len(remaining) // eta)]
+            remaining = [i for i in remaining if i == leader or scores[i] + half_widths[i] >= scores[leader] - half_widths[leader]]
+            samples *= eta
+            round_number += 1
+    ranking = []
+    for i, candidate in enumerate(candidates):
+        half_widths = histograms[i].half_widths()
+        ranking.append({
+            'setup': candidate,
+            'rounds': rounds[i] + 1,
+            'simulations': histograms[i].simulations,
+            'run_rate': float(histograms[i].run_rate()),
+            'run_rate_half_width': half_widths['run_rate'],
+            'mean': histograms[i].mean(),
+            'mean_half_width': half_widths['mean'],
+        })
+    return sorted(ranking, key=lambda row: (-row['rounds'], -optimizer_score(row[objective], objective)))
+
+# Prints the ranking of optimize_team.
+def print_ranking(ranking, top=10):
+    for row in ranking[:top]:
+        setup = ', '.join(f'{name} {field}={value}' for name, field, value in row['setup'])
+        print(f"{row['run_rate']:6.2f}% \u00b1 {row['run_rate_half_width']:.2f}  {row['mean']:.3f}s \u00b1 {row['mean_half_width']:.3f}  "
+              f"{row['simulations']:>8} kills  {setup}")
+
+# Returns a copy of team where the acc (stat 0) or max (stat 1) of one Raider's weapon ('spec', 'claws' or 'scythe')
+# is changed by step.
+def perturbed_team(team, j, weapon, stat, step):
+    team = list(team)
+    r = team[j] = copy.copy(team[j])
+    loadout = r.loadout = copy.copy(r.loadout)
+    values = list(getattr(loadout, weapon))
+    values[stat] += step
+    setattr(loadout, weapon, tuple(values))
+    return team
+
+# Estimates how much every gear stat and Tekton stat moves the run rate and mean room time, by central finite
+# differences: each one is raised and lowered by its step and x kills are simulated for both. Every run uses the same
+# seed, so the differences come from the change instead of the luck of the runs. Returns one row per parameter with
+# the change in run rate (percentage points) and mean room time (seconds) per step, largest run rate effect first.
+# The kills are split into batches sub-batches on seeds shared by both sides, and the standard errors come from the
+# spread of the paired sub-batch differences, so they account for the common random numbers.
+def sensitivity(x, acc_step=1000, max_step=1, hp_step=10, def_step=5, maxhit_step=1, seed=None, batches=10):
+    seeds = np.random.SeedSequence(seed).spawn(batches)
+    sizes = [x // batches + (b < x % batches) for b in range(batches)]
+    team = createTeam()
+    runs = []
+    for j, r in enumerate(team):
+        for weapon in ['spec', 'claws', 'scythe']:
+            if getattr(r.loadout, weapon) is None:
+                continue
+            label = r.specwep if weapon == 'spec' else weapon
+            for stat, name, step in [(0, 'acc', acc_step), (1, 'max', max_step)]:
+                runs.append((f'{r.name} {label} {name}', step, [(perturbed_team(team, j, weapon, stat, sign * step), {}) for sign in [1, -1]]))
+    for name, step in [('hitpoints', hp_step), ('defence', def_step), ('maxhit', maxhit_step)]:
+        sides = []
+        for sign in [1, -1]:
+            overrides = {name: globals()[name] + sign * step}
+            if name == 'defence':
+                overrides['initial_defence'] = overrides['defence']
+            sides.append((team, overrides))
+        runs.append((f'Tekton {name}', step, sides))
+    rows = []
+    for parameter, step, sides in runs:
+        # Histograms per side and sub-batch, every sub-batch runs on the same seed for both sides.
+        histograms = []
+        for side_team, overrides in sides:
+            with settings(**overrides):
+                histograms.append([sim_histogram(size, np.random.default_rng(batch_seed), team=side_team) for size, batch_seed in zip(sizes, seeds)])
+        up, down = [functools.reduce(KillHistogram.merge, side, KillHistogram()) for side in histograms]
+        differences = np.array([(u.run_rate() - d.run_rate(), u.mean() - d.mean()) for u, d in zip(*histograms)]) / 2
+        standard_errors = differences.std(axis=0, ddof=1) / math.sqrt(batches)
+        rows.append({
+            'parameter': parameter,
+            'step': step,
+            'run_rate': float(up.run_rate() - down.run_rate()) / 2,
+            'run_rate_se': float(standard_errors[0]),
+            'mean': (up.mean() - down.mean()) / 2,
+            'mean_se': float(standard_errors[1]),
+        })
+    return sorted(rows, key=lambda row: -abs(row['run_rate']))
+
+# Prints the rows of sensitivity as a table.
+def print_sensitivity(rows):
+    print(f"{'Parameter':<24} {'Step':>6} {'Runable':>9} {'SE':>6} {'Mean':>8} {'SE':>6}")
+    for row in rows:
+        print(f"{row['parameter']:<24} {row['step']:>+6} {row['run_rate']:>+8.2f}% {row['run_rate_se']:>6.2f} "
+              f"{row['mean']:>+7.3f}s {row['mean_se']:>6.3f}")
+
+# Team sizes createTeam has a team for.
+SUPPORTED_PLAYERS = [1, 2, 3, 5, 7]
+
+# Simulates x kills of the createTeam team for a team size and mode. Runs in the scaling sweep's worker processes.
+def sim_scale(num_players, challenge_mode, x, seed, overrides=None):
+    with settings(**dict(overrides or {}, **scale_settings(num_players, challenge_mode))):
+        return sim_histogram(x, np.random.default_rng(seed))
+
+# Simulates x kills for every combination of team size and mode in parallel, and returns one row per combination with
+# Tekton's scaled stats and the report of its kills. Set path to also save a chart of them.
+def scaling_sweep(x, players=None, modes=(False, True), workers=None, seed=None, path=None):
+    combinations = list(itertools.product(players or SUPPORTED_PLAYERS, modes))
+    seeds = np.random.SeedSequence(seed).spawn(len(combinations))
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        histograms = executor.map(sim_scale, *zip(*combinations), itertools.repeat(x), seeds, itertools.repeat(worker_settings()))
+        for (num_players, challenge_mode), histogram in zip(combinations, histograms):
+            hp, defence, maxhit = scaled_stats(num_players, challenge_mode)
+            rows.append(dict(report(histogram), players=num_players, challenge_mode=challenge_mode, hitpoints=hp, defence=defence, maxhit=maxhit))
+    if path:
+        render_scaling(rows, path)
+    return rows
+
+# Prints the rows of a scaling sweep as a table.
+def print_scaling(rows):
+    print(f"{'Players':>7} {'CM':>5} {'HP':>5} {'Def':>4} {'Max':>4} {'Runable':>8} {'Left':>7} {'Mean':>6} {'Mode':>5}")
+    for row in rows:
+        print(f"{row['players']:>7} {str(row['challenge_mode']):>5} {row['hitpoints']:>5} {row['defence']:>4} {row['maxhit']:>4} "
+              f"{row['run_rate']:>7.2f}% {row['leave_rate']:>6.2f}% {row['mean']:>6.2f} {row['mode']:>5}")
+
+# Saves a chart of the run rate and mean room time of every team size and mode with the Agg backend.
+def render_scaling(rows, path):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 7.5))
+    FigureCanvasAgg(fig)
+    run_ax, mean_ax = fig.subplots(2, 1, sharex=True)
+    for challenge_mode in sorted({row['challenge_mode'] for row in rows}):
+        mode_rows = [row for row in rows if row['challenge_mode'] == challenge_mode]
+        label = 'CM' if challenge_mode else 'Normal'
+        run_ax.plot([row['players'] for row in mode_rows], [row['run_rate'] for row in mode_rows], marker='o', label=label)
+        mean_ax.plot([row['players'] for row in mode_rows], [row['mean'] for row in mode_rows], marker='o', label=label)
+    run_ax.set_ylabel(f"Runable % (<={RUNABLE_TIME}s)")
+    mean_ax.set_ylabel("Mean room time")
+    mean_ax.set_xlabel("Players")
+    run_ax.legend()
+    run_ax.set_title(f"{rows[0]['simulations']} Tekton simulations per team size")
+    fig.savefig(path)
+
+# Class to count what happens in killTekton: attacks by type, thrall hits, venge procs and overkill kills, with the
+# time spent per attack type and the damage every Raider dealt. Nothing is measured unless it is active, see instrument.
+class Profiler:
+    def __init__(self):
+        self.events = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.damage = defaultdict(lambda: defaultdict(int))
+        self.kills = 0
+
+    # Adds one kill's result from killTekton.
+    def add_kill(self, ticks, defence, overkill):
+        self.kills += 1
+        if overkill:
+            self.events['overkill'] += 1
+
+    def to_dict(self):
+        return {
+            'kills': self.kills,
+            'events': dict(self.events),
+            'seconds': dict(self.seconds),
+            'damage': {name: dict(damage) for name, damage in self.damage.items()},
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    # Prints the counters as tables, per kill where that makes sense.
+    def print_table(self):
+        print(f"{self.kills} kills")
+        print(f"{'Event':<14} {'Count':>10} {'Per kill':>9} {'Time':>9}")
+        for event, count in sorted(self.events.items(), key=lambda item: -item[1]):
+            seconds = f"{self.seconds[event]:.3f}s" if event in self.seconds else ''
+            print(f"{event:<14} {count:>10} {count / max(self.kills, 1):>9.2f} {seconds:>9}")
+        events = sorted({event for damage in self.damage.values() for event in damage})
+        print(f"{'Raider':<12}" + ''.join(f" {event:>13}" for event in events) + f" {'Per kill':>9}")
+        for name, damage in self.damage.items():
+            total = sum(damage.values())
+            print(f"{name:<12}" + ''.join(f" {damage[event]:>13}" for event in events) + f" {total / max(self.kills, 1):>9.1f}")
+
+# Returns the type of attack Raider.attack is about to do, following the same order of checks.
+def attack_type(r, re_bgs):
+    if r.start_with_scythe:
+        return 'forced scythe'
+    if not r.hasSpecced and r.energy >= 50 and r.specwep in ['maul', 'bgs']:
+        return r.specwep
+    if re_bgs:
+        return 're-bgs'
+    if r.claws and r.energy >= 50:
+        return 'claw'
+    return 'scythe'
+
+# Counts every attack, thrall hit and venge of killTekton into profiler while the block runs, by wrapping the Raider
+# methods for the duration. Outside of the block the simulator runs the plain methods, so it costs nothing.
+@contextlib.contextmanager
+def instrument(profiler):
+    attack, thrall_attack, venge = Raider.attack, Raider.thrall_attack, Raider.venge
+
+    def counted_attack(self, tekton, re_bgs=False):
+        event = attack_type(self, re_bgs)
+        hp = tekton.hp
+        start = time.perf_counter()
+        attack(self, tekton, re_bgs)
+        profiler.seconds[event] += time.perf_counter() - start
+        profiler.events[event] += 1
+        profiler.damage[self.name][event] += hp - tekton.hp
+
+    def counted_thrall_attack(self, tekton):
+        hp = tekton.hp
+        thrall_attack(self, tekton)
+        profiler.events['thrall'] += 1
+        profiler.damage[self.name]['thrall'] += hp - tekton.hp
+
+    def counted_venge(self, tekton):
+        hp = tekton.hp
+        venge(self, tekton)
+        if tekton.hp != hp:
+            profiler.events['venge'] += 1
+            profiler.damage[self.name]['venge'] += hp - tekton.hp
+
+    Raider.attack, Raider.thrall_attack, Raider.venge = counted_attack, counted_thrall_attack, counted_venge
+    try:
+        yield profiler
+    finally:
+        Raider.attack, Raider.thrall_attack, Raider.venge = attack, thrall_attack, venge
+
+# Simulates x kills with killTekton while counting their events, and returns the Profiler.
+def profile_kills(x):
+    profiler = Profiler()
+    with instrument(profiler):
+        for i in range(x):
+            profiler.add_kill(*killTekton())
+    return profiler
+
+# Times the engines of benchmark_engines on x kills each and returns kills per second by engine. Set profile to also
+# print the functions the scalar and batch engines spend the most time in, from cProfile.
+def profile_engines(x, seed=None, profile=False, top=15, workers=None):
+    engines = benchmark_engines(x, seed, workers)
+    warm_up_engines(min(x, 1000), seed, workers)
+    rates = {}
+    for name, engine in engines.items():
+        start = time.perf_counter()
+        engine()
+        rates[name] = x / (time.perf_counter() - start)
+        print(f"{name:<20} {rates[name]:>10.0f} kills/s")
+    if profile:
+        for name in ['scalar', 'batch']:
+            profiler = cProfile.Profile()
+            profiler.runcall(engines[name])
+            print(f"\n{name}:")
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(top)
+    return rates
+
+# Actions recorded in kill traces.
+class Action(IntEnum):
+    MAUL = 0
+    BGS = 1
+    RE_BGS = 2
+    CLAW = 3
+    SCYTHE = 4
+    FORCED_SCYTHE = 5
+    THRALL = 6
+    VENGE = 7
+
+# Fixed-width record of one traced event. draw is the number of random draws the raid had made before the event.
+TRACE_DTYPE = np.dtype([('raid', '<u4'), ('tick', '<u2'), ('pid', '<u2'), ('action', 'u1'), ('damage', '<i2'),
+                        ('defence_before', '<i2'), ('defence_after', '<i2'), ('hp_after', '<i2'), ('draw', '<u4')])
+TRACE_ACTIONS = {'maul': Action.MAUL, 'bgs': Action.BGS, 're-bgs': Action.RE_BGS, 'claw': Action.CLAW,
+                 'scythe': Action.SCYTHE, 'forced scythe': Action.FORCED_SCYTHE}
+
+# Random stream that counts its draws, so trace events can point at the draw they started from.
+class CountingRandom(random.Random):
+    draws = 0
+
+    def seed(self, *args, **kwargs):
+        self.draws = 0
+        super().seed(*args, **kwargs)
+
+    def random(self):
+        self.draws += 1
+        return super().random()
+
+    def randint(self, a, b):
+        self.draws += 1
+        return super().randint(a, b)
+
+    # Keeps randint on getrandbits, so this stream draws the same numbers as a plain random.Random.
+    def getrandbits(self, k):
+        return super().getrandbits(k)
+
+# Records the events of killTekton as raid number raid into records while the block runs, by wrapping the Raider
+# methods like instrument. Only the traced raids pay for the wrappers.
+@contextlib.contextmanager
+def record_events(records, raid, stream):
+    attack, thrall_attack, venge = Raider.attack, Raider.thrall_attack, Raider.venge
+
+    def recorded(method, action_for):
+        def wrapper(self, tekton, **kwargs):
+            hp, defence_before, draw = tekton.hp, tekton.defence, stream.draws
+            action = action_for(self, **kwargs)
+            method(self, tekton, **kwargs)
+            # Venges that were skipped don't roll anything.
+            if action != Action.VENGE or stream.draws != draw:
+                records.append((raid, tekton.tick, self.pid, action, hp - tekton.hp, defence_before, tekton.defence, tekton.hp, draw))
+        return wrapper
+
+    Raider.attack = recorded(attack, lambda r, re_bgs=False: TRACE_ACTIONS[attack_type(r, re_bgs)])
+    Raider.thrall_attack = recorded(thrall_attack, lambda r: Action.THRALL)
+    Raider.venge = recorded(venge, lambda r: Action.VENGE)
+    try:
+        yield
+    finally:
+        Raider.attack, Raider.thrall_attack, Raider.venge = attack, thrall_attack, venge
+
+# Simulates x kills and records every event of 1 in every raids to a trace file at path, which is memory-mapped
+# when loaded. Every raid rolls from its own stream seeded with the seed and its number, so replay can rebuild any
+# traced raid exactly. The seed and settings go to a JSON file next to the trace. Returns the KillHistogram.
+def trace_kills(x, path, every=100, seed=None):
+    seed = np.random.SeedSequence(seed).entropy
+    state = KillState()
+    # Untraced raids roll from a plain stream, it draws the same numbers without the cost of counting them.
+    plain, counted = random.Random(), CountingRandom()
+    histogram = KillHistogram()
+    records = []
+    with open(path, 'wb') as f:
+        for i in range(x):
+            stream = counted if i % every == 0 else plain
+            stream.seed(f'{seed}-{i}')
+            for r in state.template:
+                r.rng = stream
+            if stream is plain:
+                histogram.add(*killTekton(state, stream))
+                continue
+            with record_events(records, i, stream):
+                histogram.add(*killTekton(state, stream))
+            if len(records) >= BATCH_SIZE:
+                f.write(np.array(records, dtype=TRACE_DTYPE).tobytes())
+                records.clear()
+        f.write(np.array(records, dtype=TRACE_DTYPE).tobytes())
+    with open(path + '.json', 'w') as f:
+        json.dump({'seed': str(seed), 'simulations': x, 'every': every, 'scenario': scenario_key()}, f)
+    return histogram
+
+# Loads a trace file as a read-only memory-mapped record array, with the metadata written next to it.
+def load_trace(path):
+    with open(path + '.json') as f:
+        meta = json.load(f)
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=TRACE_DTYPE), meta
+    return np.memmap(path, dtype=TRACE_DTYPE, mode='r'), meta
+
+# Rebuilds raid number raid of a trace by simulating it again from the trace's seed, and returns its records and
+# result. The current team and settings must match the ones the trace was recorded with.
+def replay(path, raid):
+    _, meta = load_trace(path)
+    if meta['scenario'] != scenario_key():
+        raise ValueError(f"{path} was recorded with a different team or settings")
+    state = KillState()
+    stream = CountingRandom(f"{meta['seed']}-{raid}")
+    for r in state.template:
+        r.rng = stream
+    records = []
+    with record_events(records, raid, stream):
+        result = killTekton(state, stream)
+    return np.array(records, dtype=TRACE_DTYPE), result
+
+# Prints trace records, one event per line.
+def print_trace(records):
+    for record in records:
+        print(f"raid {record['raid']} tick {record['tick']:>3} pid {record['pid']:>4} {Action(record['action']).name:<13} "
+              f"damage {record['damage']:>3} def {record['defence_before']:>3} -> {record['defence_after']:>3} "
+              f"hp {record['hp_after']:>5} draw {record['draw']}")
+
+# Fight distributions hold the chances of every Tekton defence and HP lost, indexed by [defence, HP lost - offset].
+# Only the occupied range of HP lost is stored, starting at offset, so damage shifts chances to higher columns.
+
+# Lands damage on a fight distribution, pmf_for(d) gives the damage pmf for defence d.
+# Returns the surviving distribution, which keeps the same offset, and the chance Tekton died, per defence.
+def apply_damage(dist, offset, pmf_for):
+    rows = np.flatnonzero(dist.any(axis=1))
+    pmfs = {d: pmf_for(d) for d in rows}
+    width = min(dist.shape[1] + max(len(pmf) for pmf in pmfs.values()) - 1, hitpoints - offset)
+    alive = np.zeros((len(dist), width))
+    died = np.zeros(len(dist))
+    for d, pmf in pmfs.items():
+        after = np.convolve(dist[d], pmf)
+        alive[d, :min(len(after), width)] = after[:width]
+        died[d] = after[width:].sum()
+    return alive, died
+
+# Lands a do_maul attack on a fight distribution. Returns the surviving distribution and the chance Tekton died, per defence.
+def apply_maul(dist, offset, maxAttRoll, maxHit):
+    width = min(dist.shape[1] + maxHit, hitpoints - offset)
+    alive = np.zeros((len(dist), width))
+    died = np.zeros(len(dist))
+    pmf = uniform_pmf(0, maxHit)
+    for d in np.flatnonzero(dist.any(axis=1)):
+        accuracy = 1.0 if d == defence else float(sim_acc_batch(d, Style.CRUSH, maxAttRoll))
+        after = np.convolve(dist[d], pmf) * accuracy
+        alive[math.ceil(d * 0.65), :min(len(after), width)] += after[:width]
+        died[math.ceil(d * 0.65)] += after[width:].sum()
+        alive[math.ceil(d * 0.95), :dist.shape[1]] += dist[d] * (1 - accuracy)
+    return alive, died
+
+# Lands a do_bgs attack on a fight distribution. Every hit lowers defence and HP by the same amount, so it moves
+# chances diagonally. Returns the surviving distribution and the chance Tekton died, per defence.
+def apply_bgs(dist, offset, maxAttRoll, maxHit):
+    columns = dist.shape[1]
+    width = min(columns + maxHit, hitpoints - offset)
+    alive = np.zeros((len(dist), width))
+    died = np.zeros(len(dist))
+    # Only work on the defences up to the highest occupied one.
+    rows = np.flatnonzero(dist.any(axis=1)).max() + 1
+    accuracy = sim_acc_batch(np.arange(rows), Style.SLASH, maxAttRoll)[:, None]
+    missed = dist[:rows] * (1 - accuracy)
+    alive[:max(rows - 10, 0), :columns] += missed[10:]
+    alive[0, :columns] += missed[:10].sum(axis=0)
+    landed = dist[:rows] * accuracy
+    # A hit kills Tekton once it pushes chances past the last column, tails[:, k] holds the last k + 1 columns.
+    tails = np.cumsum(landed[:, ::-1], axis=1)
+    gap = hitpoints - offset - columns
+    for hit in range(1, maxHit + 1):
+        chance = (2 if hit == 1 else 1) / (maxHit + 1) # REBALANCE UPDATE
+        kept_rows = max(rows - hit, 0)
+        # Columns shifted past the last one are kills, a hit can push every column past it when Tekton has little HP left.
+        shifted = max(0, min(columns, width - hit))
+        if shifted:
+            alive[:kept_rows, hit:hit + shifted] += chance * landed[hit:, :shifted]
+            alive[0, hit:hit + shifted] += chance * landed[:hit, :shifted].sum(axis=0)
+        if hit > gap:
+            kills = chance * tails[:, min(hit - gap, columns) - 1]
+            died[:kept_rows] += kills[hit:]
+            died[0] += kills[:hit].sum()
+    return alive, died
+
+# Adds a fight distribution to a group of states, widening the stored HP range where needed. Distributions without any
+# chance left, e.g. after an attack that always kills, aren't stored, so every state holds a live Tekton.
+def add_dist(states, key, offset, dist):
+    if not dist.any():
+        return
+    if key not in states:
+        states[key] = (offset, dist)
+        return
+    other_offset, other = states[key]
+    start = min(offset, other_offset)
+    end = max(offset + dist.shape[1], other_offset + other.shape[1])
+    if start == other_offset and end == other_offset + other.shape[1]:
+        other[:, offset - start:offset - start + dist.shape[1]] += dist
+        return
+    merged = np.zeros((len(dist), end - start))
+    merged[:, other_offset - start:other_offset - start + other.shape[1]] += other
+    merged[:, offset - start:offset - start + dist.shape[1]] += dist
+    states[key] = (start, merged)
+
+# Crops a fight distribution to its occupied HP range. Returns the new offset and distribution.
+def crop_dist(offset, dist):
+    columns = np.flatnonzero(dist.any(axis=0))
+    if not len(columns):
+        return offset, dist[:, :0]
+    return offset + columns[0], dist[:, columns[0]:columns[-1] + 1]
+
+# Collapses a Raider's venge state to the values that still matter for the rest of the fight.
+def canonical_venge(hp, vengeAmount, meleePray):
+    if vengeAmount == 0:
+        return 0, 0, False
+    # Only the melee pray and skip checks of the last venge still look at hp.
+    if vengeAmount == 1:
+        if hp <= math.floor(maxhit / 2):
+            return math.floor(maxhit / 2), 1, False
+        if hp <= maxhit:
+            return maxhit, 1, True
+        return maxhit + 1, 1, meleePray
+    return hp, vengeAmount, meleePray
+
+# Chance of every team order produced by sorting on random pids, ties keep the createTeam order.
+def pid_order_chances(k, pid_count=2001):
+    chances = {}
+    for order in itertools.permutations(range(k)):
+        weak = sum(a < b for a, b in zip(order, order[1:]))
+        chances[order] = math.comb(pid_count + weak, k) / pid_count ** k
+    return chances
+
+# Class to hold the kill distribution computed by solve_exact.
+# probs[ticks, defence, overkill] is the chance of a kill ending like that. survived is the chance Tekton was
+# still alive after the last solved tick, lost is the chance dropped by the tolerance, so lost bounds the error.
+class KillDistribution:
+    def __init__(self, probs, survived, lost, last_tick):
+        self.probs = probs
+        self.survived = survived
+        self.lost = lost
+        self.last_tick = last_tick
+
+    # Returns a histogram of chances instead of counts, so the usual statistics work on it.
+    # Raids still alive after the last solved tick count as left, which is exact as long as last_tick >= CUTOFF_TICK.
+    def histogram(self):
+        histogram = KillHistogram()
+        ticks = np.arange(len(self.probs))[:, None]
+        defences = np.arange(self.probs.shape[1])[None, :]
+        kept = raid_kept(ticks, defences)[:, :, None] * self.probs
+        histogram.counts = kept.sum(axis=1)
+        histogram.simulations = 1.0
+        histogram.raids_left = self.probs.sum() - kept.sum() + self.survived
+        histogram.zero_def_count = kept[:, 0].sum()
+        return histogram
+
+# Returns what solve_order knows of a reset Raider: its loadout and the state it starts a kill in. Raiders with the same
+# values are interchangeable, swapping them doesn't change a team order's kill distribution.
+def solver_raider(r):
+    loadout = r.loadout
+    return ((r.specwep, loadout.spec or (0, 0), r.claws, loadout.claws or (0, 0), loadout.scythe, loadout.style, r.thrall, r.thrallTier, r.re_bgs_threshold),
+            (r.cooldown, r.energy, r.hasSpecced, r.start_with_scythe, r.thrallCooldown if r.thrall else 0,
+             *canonical_venge(r.hp, r.vengeAmount, r.meleePray)))
+
+# Solves the kill distribution for a single team order by propagating chances tick by tick.
+# Chances are grouped by the state of every raider, each group holding a distribution over Tekton's defence and HP.
+# Returns kills[ticks][defence, overkill] and the chances that survived and were dropped.
+def solve_order(team, tolerance, max_ticks):
+    team = reset_team(team)
+    loadouts, raiders = zip(*map(solver_raider, team))
+    defences = np.arange(defence + 1)
+    dist = np.zeros((defence + 1, 1))
+    dist[defence, 0] = 1
+    states = {raiders: (0, dist)}
+    kills = defaultdict(lambda: np.zeros((defence + 1, 2)))
+    lost = 0.0
+    tick = 0
+
+    def with_raider(raiders, j, raider):
+        return raiders[:j] + (raider,) + raiders[j + 1:]
+
+    while states and (max_ticks is None or tick < max_ticks):
+        # Re-bgs checks use Tekton's defence at the start of the tick, so split every group on them up front.
+        split = {}
+        for raiders, (offset, dist) in states.items():
+            checks = np.zeros((defence + 1, len(team)), dtype=bool)
+            for j, (cooldown, energy, specced, *_) in enumerate(raiders):
+                threshold = loadouts[j][8]
+                if cooldown == 0 and threshold > 0 and energy >= 50 and specced:
+                    checks[:, j] = defences > threshold
+            rows = np.flatnonzero(dist.any(axis=1))
+            for re_bgs in np.unique(checks[rows], axis=0):
+                part = np.zeros_like(dist)
+                matching = rows[(checks[rows] == re_bgs).all(axis=1)]
+                part[matching] = dist[matching]
+                split[raiders, tuple(re_bgs)] = (offset, part)
+        states = split
+
+        for j, (specwep, spec, has_claws, claws, scythe, style, has_thrall, tier, threshold) in enumerate(loadouts):
+            # Attacks
+            after = {}
+            for (raiders, re_bgs), (offset, dist) in states.items():
+                cooldown, energy, specced, sws, thrall_cd, hp, venge, melee = raiders[j]
+                if cooldown != 0:
+                    add_dist(after, (with_raider(raiders, j, (cooldown - 1, energy, specced, sws, thrall_cd, hp, venge, melee)), re_bgs), offset, dist)
+                    continue
+                if sws:
+                    raider = (4, energy, specced, False, thrall_cd, hp, venge, melee)
+                    alive, died = apply_damage(dist, offset, lambda d: scythe_pmf(d, style, *scythe))
+                elif (not specced and energy >= 50 and specwep in ['maul', 'bgs']) or re_bgs[j]:
+                    raider = (5, energy - 50, True, sws, thrall_cd, hp, venge, melee)
+                    if specwep == 'maul' and not re_bgs[j]:
+                        alive, died = apply_maul(dist, offset, *spec)
+                    else:
+                        alive, died = apply_bgs(dist, offset, *spec)
+                elif has_claws and energy >= 50:
+                    raider = (3, energy - 50, specced, sws, thrall_cd, hp, venge, melee)
+                    alive, died = apply_damage(dist, offset, lambda d: claw_pmf(d, *claws))
+                else:
+                    raider = (4, energy, specced, sws, thrall_cd, hp, venge, melee)
+                    alive, died = apply_damage(dist, offset, lambda d: scythe_pmf(d, style, *scythe))
+                kills[tick + 1][:, 1] += died
+                add_dist(after, (with_raider(raiders, j, raider), re_bgs), offset, alive)
+            states = after
+
+            # Thralls
+            if has_thrall:
+                after = {}
+                for (raiders, re_bgs), (offset, dist) in states.items():
+                    cooldown, energy, specced, sws, thrall_cd, hp, venge, melee = raiders[j]
+                    if thrall_cd != 0:
+                        add_dist(after, (with_raider(raiders, j, (cooldown, energy, specced, sws, thrall_cd - 1, hp, venge, melee)), re_bgs), offset, dist)
+                        continue
+                    # Like sim_thrall, only tiers 1 to 3 hit.
+                    alive, died = apply_damage(dist, offset, lambda d: uniform_pmf(0, tier if 1 <= tier <= 3 else 0))
+                    kills[tick + 1][:, 0] += died
+                    add_dist(after, (with_raider(raiders, j, (cooldown, energy, specced, sws, 3, hp, venge, melee)), re_bgs), offset, alive)
+                states = after
+
+            # Venges
+            after = {}
+            for (raiders, re_bgs), (offset, dist) in states.items():
+                cooldown, energy, specced, sws, thrall_cd, hp, venge, melee = raiders[j]
+                if venge == 0:
+                    add_dist(after, (raiders, re_bgs), offset, dist)
+                    continue
+                melee = melee or hp <= maxhit
+                if hp <= math.floor(maxhit / 2):
+                    add_dist(after, (with_raider(raiders, j, (cooldown, energy, specced, sws, thrall_cd, 0, 0, False)), re_bgs), offset, dist)
+                    continue
+                top = math.floor(maxhit / 2) if melee else maxhit
+                # Group the venge rolls by the raider state they leave behind.
+                outcomes = {}
+                for damage in range(1, top + 1):
+                    raider = (cooldown, energy, specced, sws, thrall_cd, *canonical_venge(hp - damage, venge - 1, melee))
+                    pmf = outcomes.setdefault(raider, np.zeros(maxhit + 1))
+                    pmf[max(math.floor(damage * VENGE_DAMAGE_MULTIPLIER), 1)] += 1 / top
+                for raider, pmf in outcomes.items():
+                    alive, died = apply_damage(dist, offset, lambda d: pmf)
+                    kills[tick + 1][:, 0] += died
+                    add_dist(after, (with_raider(raiders, j, raider), re_bgs), offset, alive)
+            states = after
+
+        tick += 1
+        merged = {}
+        for (raiders, _), (offset, dist) in states.items():
+            add_dist(merged, raiders, offset, dist)
+        alive_mass = sum(dist.sum() for _, dist in merged.values())
+        if alive_mass <= tolerance - lost:
+            states = merged
+            break
+        # Trim the unlikely HP tails of every group while the tolerance allows it, so they don't need convolving.
+        share = (tolerance - lost) / 4 / len(merged) / 2
+        states = {}
+        for raiders, (offset, dist) in merged.items():
+            columns = dist.sum(axis=0)
+            first = np.searchsorted(np.cumsum(columns), share, side='right')
+            last = len(columns) - np.searchsorted(np.cumsum(columns[::-1]), share, side='right')
+            if first < last:
+                lost += columns[:first].sum() + columns[last:].sum()
+                states[raiders] = crop_dist(offset + first, dist[:, first:last])
+            else:
+                lost += columns.sum()
+    survived = sum(dist.sum() for _, dist in states.values())
+    return dict(kills), survived, lost
+
+# Solves one team order in a worker with the settings of the process that sent it, see worker_settings.
+def solve_order_shard(team, tolerance, max_ticks, overrides):
+    with settings(**overrides):
+        return solve_order(team, tolerance, max_ticks)
+
+# Computes the exact distribution of ticks, final defence and overkill without sampling, by propagating chances over
+# Tekton's HP and defence and every raider's state tick by tick, for every possible team order.
+# Unlikely HP tails are dropped while the total dropped chance stays below tolerance, which bounds the error.
+# Set max_ticks to stop early, e.g. at CUTOFF_TICK when only the kept kills matter. Team orders are spread over workers.
+# A team of k different Raiders has k! orders, orders that only swap interchangeable Raiders are solved once. Every
+# order takes seconds, the 120 orders of the CM 5-man team take about 200s on one CPU and 7 different Raiders would
+# need 5040, so more than max_orders orders raise a ValueError unless max_orders is raised.
+def solve_exact(tolerance=1e-9, max_ticks=None, workers=None, max_orders=120):
+    team = reset_team(createTeam())
+    signatures = [solver_raider(r) for r in team]
+    chances = defaultdict(float)
+    teams = {}
+    for order, chance in pid_order_chances(len(team)).items():
+        key = tuple(signatures[i] for i in order)
+        chances[key] += chance
+        teams.setdefault(key, [team[i] for i in order])
+    if len(teams) > max_orders:
+        raise ValueError(f"The team has {len(teams)} different orders to solve, more than max_orders={max_orders}")
+    kills = defaultdict(lambda: np.zeros((defence + 1, 2)))
+    survived = lost = 0.0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        solved = executor.map(solve_order_shard, teams.values(), itertools.repeat(tolerance), itertools.repeat(max_ticks), itertools.repeat(worker_settings()))
+        for chance, (order_kills, order_survived, order_lost) in zip(chances.values(), solved):
+            for tick, probs in order_kills.items():
+                kills[tick] += chance * probs
+            survived += chance * order_survived
+            lost += chance * order_lost
+    last_tick = max(kills, default=0)
+    probs = np.zeros((last_tick + 1, defence + 1, 2))
+    for tick, tick_probs in kills.items():
+        probs[tick] = tick_probs
+    return KillDistribution(probs, survived, lost, last_tick)
+
+# Solves the kill distribution at every Tekton HP in hitpoints_values, including ones low enough that a single hit can
+# kill from any state, and returns the ones where the chances of kills, survival and dropped tails don't add up to 1.
+def check_exact(hitpoints_values=(150, 100), tolerance=1e-9, workers=None):
+    failures = []
+    for hp in hitpoints_values:
+        with settings(hitpoints=hp):
+            solved = solve_exact(tolerance, workers=workers)
+        total = solved.probs.sum() + solved.survived + solved.lost
+        print(f"{hp:>5} HP: chances add up to {total:.12f}")
+        if abs(total - 1) > tolerance:
+            failures.append(hp)
+    return failures
+
+# Builds the tables of adjusted room ticks and room times in seconds, both indexed by [ticks, overkill].
+@functools.lru_cache(maxsize=None)
+def build_room_tables(size, close_lure, entry_ticks, death_anim, overkill_death_anim, walkback_tick, walkback_death_anim, crystal_anim):
+    ticks = np.arange(size)[:, None]
+    anims = np.where(np.array([False, True]), overkill_death_anim, death_anim)
+    if close_lure:
+        anims = np.where(ticks >= walkback_tick, walkback_death_anim, anims)
+    tick_table = -(-(ticks + entry_ticks + anims) // 4) * 4 + crystal_anim
+    time_table = np.array([round(t * 0.6, 1) for t in tick_table.ravel()]).reshape(tick_table.shape)
+    tick_table.flags.writeable = False
+    time_table.flags.writeable = False
+    return tick_table, time_table
+
+# Returns the room tables for at least the given number of ticks.
+# They are rebuilt whenever one of the timing settings changes.
+def room_tables(size=0):
+    size = max(64, -(-size // 64) * 64)
+    return build_room_tables(size, CLOSE_LURE, ENTRY_TICKS, DEATH_ANIM, OVERKILL_DEATH_ANIM, WALKBACK_TICK, WALKBACK_DEATH_ANIM, CRYSTAL_ANIM)
+
+# Returns the room tick table for at least the given number of ticks.
+def room_tick_table(size=0):
+    return room_tables(size)[0]
+
+# Returns the room time table in seconds for at least the given number of ticks.
+def room_time_table(size=0):
+    return room_tables(size)[1]
+
+# Looks up the adjusted room ticks for arrays of ticks and overkill flags.
+def room_ticks(ticks, overkill):
+    ticks = np.asarray(ticks, dtype=np.int64)
+    table = room_tick_table(int(ticks.max(initial=0)) + 1)
+    return np.take(table, ticks * 2 + np.asarray(overkill, dtype=np.int64))
+
+# Looks up the room times in seconds for arrays of ticks and overkill flags.
+def room_seconds(ticks, overkill):
+    ticks = np.asarray(ticks, dtype=np.int64)
+    table = room_time_table(int(ticks.max(initial=0)) + 1)
+    return np.take(table, ticks * 2 + np.asarray(overkill, dtype=np.int64))
+
+# Converts ticks to seconds.
 def ticks_to_seconds(ticks, overkill):
-    seconds = []
-    adjusted_ticks = round_to_cycle(ticks, overkill)
-    for i in adjusted_ticks:
-        seconds.append(round(i * 0.6, 1))
-    return seconds
+    return room_seconds(ticks, overkill).tolist()
 
 # Adjusts and rounds ticks to kill to line up with the game's 4-tick cycle.
 def round_to_cycle(ticks, overkill):
-    adjusted_ticks = []
-    entry_ticks = 11
-    death_anim = 4
-    crystal_anim = 4
-    for index, value in enumerate(ticks):
-        #print(f'Starting ticks: {value}')
-        # On tick 28 Tekton starts walking back to the anvil, slowing down the death animation.
-        if value >= 28 and CLOSE_LURE:
-            death_anim = 6
-        # Death animation is sped up by overkill.
-        elif overkill[index]:
-            death_anim = 3
-        else:
-            death_anim = 4
-        adjusted_ticks.append(math.ceil((value + entry_ticks + death_anim) / 4) * 4 + crystal_anim)
-        #print(f'Adjusted to: {adjusted_ticks[index]}')
-    return adjusted_ticks
+    return room_ticks(ticks, overkill).tolist()
 
-# Outputs the simulation results in a graph.
-def construct_graph(x, results, leave_rate, run_rate):
-    # Note under the title
-    note = "rancour, bellator"
+# Draws the room time graph of a histogram on a matplotlib figure.
+def draw_graph(fig, histogram, note="rancour, bellator"):
     step = 2.4
-    results = np.array(results)
-    print(results.mean())
-    labels, counts = np.unique(results, return_counts=True)
-    ax = plt.bar(labels, counts, align='center')
-    for rect in ax:
+    stats = histogram.stats()
+    labels, counts = stats.labels, stats.counts
+    mean = stats.mean()
+    ax = fig.add_subplot()
+    bars = ax.bar(labels, counts, align='center')
+    for rect in bars:
         height = rect.get_height()
-        plt.text(rect.get_x() + rect.get_width() / 2.0, height, f'{height:.0f}', ha='center', va='bottom')
-    fig = plt.gcf()
+        ax.text(rect.get_x() + rect.get_width() / 2.0, height, f'{height:.0f}', ha='center', va='bottom')
     fig.set_size_inches(10, 7.5)
-    plt.title(f"{x} Tekton simulations\n{note}", fontsize=18, pad=20)
-    plt.xticks(np.arange(min(results) - step, max(results) + (step * 3), step=step))
-    plt.xlabel("Room times", fontsize=14)
-    plt.text(0.80, 0.84, "Mean: " + str(round(results.mean(), 2)), transform=fig.transFigure)
-    plt.text(0.80, 0.81, "Mode: " + str(stats.mode(results).mode[0]), transform=fig.transFigure)
-    plt.text(0.15, 0.84, f"Raids left: {leave_rate}%", transform=fig.transFigure, fontsize="x-large", color="red")
-    plt.text(0.15, 0.81, f"Runable: {run_rate}% (<={RUNABLE_TIME}s)", transform=fig.transFigure, fontsize="large")
-    plt.text(0.15, 0.78, f"Defence leave threshold: {DEF_LEAVE_THRESHOLD}", transform=fig.transFigure)
-    plt.text(0.15, 0.76, f"Cross re-bgs: {CROSS_REBGS_THRESHOLD}", transform=fig.transFigure)
-    plt.text(0.15, 0.74, f"TG re-bgs: {TELEGRAB_REBGS_THRESHOLD}", transform=fig.transFigure)
+    # Note under the title
+    ax.set_title(f"{histogram.simulations} Tekton simulations\n{note}", fontsize=18, pad=20)
+    ax.set_xticks(np.arange(labels.min() - step, labels.max() + (step * 3), step=step))
+    ax.set_xlabel("Room times", fontsize=14)
+    fig.text(0.80, 0.84, "Mean: " + str(round(mean, 2)))
+    fig.text(0.80, 0.81, "Mode: " + str(stats.mode()))
+    fig.text(0.15, 0.84, f"Raids left: {round(histogram.leave_rate(), 2)}%", fontsize="x-large", color="red")
+    fig.text(0.15, 0.81, f"Runable: {round(stats.run_rate(), 2)}% (<={RUNABLE_TIME}s)", fontsize="large")
+    fig.text(0.15, 0.78, f"Defence leave threshold: {DEF_LEAVE_THRESHOLD}")
+    fig.text(0.15, 0.76, f"Cross re-bgs: {CROSS_REBGS_THRESHOLD}")
+    fig.text(0.15, 0.74, f"TG re-bgs: {TELEGRAB_REBGS_THRESHOLD}")
+
+# Shows the room time graph in a window. matplotlib is only imported here, headless runs never load it.
+def construct_graph(histogram):
+    import matplotlib.pyplot as plt
+    print(histogram.mean())
+    draw_graph(plt.figure(), histogram)
     plt.show()
 
-# Main function to start the simulator.
-def main(x):
-    ticks_list = []
-    overkill_list = []
-    raids_left = 0
-    zero_def_count = 0
-    runners = 0
-    for i in range(x):
-        ticks, defence, overkill = killTekton()
-        if defence > DEF_LEAVE_THRESHOLD or ticks >= CUTOFF_TICK:
-            raids_left += 1
-            continue
-        if defence <= 0:
-            zero_def_count += 1
-        ticks_list.append(ticks)
-        overkill_list.append(overkill)
-    kills_in_seconds = ticks_to_seconds(ticks_list, overkill_list)
-    zero_def_rate = round((zero_def_count / x * 100), 2)
-    leave_rate = round((raids_left / x * 100), 2)
-    for i in kills_in_seconds:
-        if i <= RUNABLE_TIME:
-            runners += 1
-    run_rate = round((runners / x * 100), 2)
-    construct_graph(x, kills_in_seconds, leave_rate, run_rate)
-
-    #print(runners)
-    #print(f"{run_rate}%")
-    #print(f"Zero def rate is {zero_def_rate}%")
-    #print(f"Leave rate is {leave_rate}%")
-    #print(f'Raids left: {raids_left}')
-    #print(kills_in_seconds)
+# Returns a summary of a histogram without plotting anything. Times are in seconds, rates in percentages.
+def report(histogram, percentiles=(5, 25, 50, 75, 95)):
+    stats = histogram.stats()
+    return {
+        'simulations': histogram.simulations,
+        'mean': stats.mean(),
+        'mode': stats.mode(),
+        'std': stats.std(),
+        'percentiles': {q: stats.percentile(q) for q in percentiles},
+        'run_rate': stats.run_rate(),
+        'leave_rate': float(histogram.leave_rate()),
+        'zero_def_rate': float(histogram.zero_def_rate()),
+    }
+
+# Renders the room time graph of a histogram to a PNG or SVG file with the Agg backend, without a window or pyplot,
+# and returns its report. overrides are the settings to draw it with when it runs in a worker, see worker_settings.
+def render_report(histogram, path, note="rancour, bellator", overrides=None):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    with settings(**(overrides or {})):
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        draw_graph(fig, histogram, note)
+        fig.savefig(path)
+        return report(histogram)
+
+# Renders the graphs of many histograms in a pool of worker processes, so the simulator can carry on meanwhile.
+# graphs is a list of (histogram, path) pairs. Returns the executor and the futures of the reports, in order.
+# Pass an executor to reuse it, otherwise the caller is responsible for shutting the returned one down.
+def render_reports(graphs, workers=None, executor=None):
+    executor = executor or ProcessPoolExecutor(max_workers=workers)
+    overrides = worker_settings()
+    return executor, [executor.submit(render_report, histogram, path, overrides=overrides) for histogram, path in graphs]
+
+# Returns the engines run_benchmarks times, by name. Every engine simulates x kills of the current team from seed
+# and returns a KillHistogram, like the matching path of main.
+def benchmark_engines(x, seed=0, workers=None):
+    def scalar(early_exit):
+        random.seed(seed)
+        histogram = KillHistogram()
+        for i in range(x):
+            histogram.add(*killTekton(early_exit=early_exit))
+        return histogram
+
+    def compiled(early_exit):
+        histogram = KillHistogram()
+        histogram.add_batch(*killTektonCompiled(x, seed, early_exit))
+        return histogram
+
+    engines = {
+        'scalar': lambda: scalar(False),
+        'scalar early exit': lambda: scalar(True),
+        'batch': lambda: sim_histogram(x, np.random.default_rng(seed)),
+        'batch early exit': lambda: sim_histogram(x, np.random.default_rng(seed), early_exit=True),
+        'parallel': lambda: run_parallel(x, seed, workers),
+    }
+    if compiled_kill_kernel() is not None:
+        engines['compiled'] = lambda: compiled(False)
+        engines['compiled early exit'] = lambda: compiled(True)
+    return engines
+
+# Runs every engine of benchmark_engines on x kills to build the damage tables, compile the kernel and start the
+# caches, so timing them afterwards only measures the steady state.
+def warm_up_engines(x, seed=0, workers=None):
+    for engine in benchmark_engines(x, seed, workers).values():
+        engine()
+
+# Returns the seconds it takes to start Python and import the simulator, and to start Python alone, the best of repeat.
+def import_seconds(repeat=5):
+    module = os.path.splitext(os.path.basename(__file__))[0]
+    folder = os.path.dirname(os.path.abspath(__file__))
+    def best(code):
+        times = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code], cwd=folder, check=True)
+            times.append(time.perf_counter() - start)
+        return min(times)
+    return best(f'import {module}'), best('pass')
+
+# Times the post-processing of x kills from histogram and arrays of ticks and overkill: round_to_cycle, report and
+# the graph of construct_graph, rendered off-screen. Returns seconds per call by step.
+def benchmark_post_processing(histogram, ticks, overkill, repeat=5):
+    steps = {
+        'round_to_cycle': lambda: round_to_cycle(ticks, overkill),
+        'report': lambda: report(histogram),
+        'construct_graph': lambda: render_report(histogram, io.BytesIO()),
+    }
+    seconds = {}
+    for name, step in steps.items():
+        times = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            step()
+            times.append(time.perf_counter() - start)
+        seconds[name] = min(times)
+    return seconds
+
+# Checks that every engine's histogram agrees with the one of reference_engine on the run rate, leave rate and mean
+# room time, with a two-sided z-test per statistic. confidence holds for the whole check, every test runs at a
+# Bonferroni-corrected level. Returns a row per engine and statistic.
+def check_agreement(histograms, reference_engine='batch', confidence=0.999):
+    reference = histograms[reference_engine]
+    others = [name for name in histograms if name != reference_engine]
+    tests = len(others) * 3
+    z_limit = statistics.NormalDist().inv_cdf(1 - (1 - confidence) / (2 * max(tests, 1)))
+    # Standard errors from the 95% half-widths.
+    z_95 = statistics.NormalDist().inv_cdf(0.975)
+    def estimates(histogram):
+        half_widths = histogram.half_widths(0.95)
+        values = {'run_rate': histogram.run_rate(), 'leave_rate': histogram.leave_rate(), 'mean': histogram.mean()}
+        return {stat: (values[stat], half_widths[stat] / z_95) for stat in values}
+    expected = estimates(reference)
+    rows = []
+    for name in others:
+        for stat, (value, se) in estimates(histograms[name]).items():
+            reference_value, reference_se = expected[stat]
+            z = (value - reference_value) / math.hypot(se, reference_se)
+            rows.append({'engine': name, 'stat': stat, 'value': value, 'reference': reference_value, 'z': z, 'agrees': abs(z) <= z_limit})
+    return rows
+
+# Compares benchmark results with a baseline from an earlier run. Throughput may drop and memory, startup and
+# post-processing times may grow by at most tolerance before they count as a regression. A baseline of another number
+# of raids or seed isn't comparable and fails as a whole.
+# Returns a message per regression.
+def check_baseline(results, baseline, tolerance=0.25):
+    mismatched = [key for key in ['raids', 'seed', 'memory_raids'] if baseline.get(key) != results[key]]
+    if mismatched:
+        return [f"baseline has {', '.join(f'{key} {baseline.get(key)}' for key in mismatched)}, this run has "
+                f"{', '.join(f'{key} {results[key]}' for key in mismatched)}"]
+    failures = []
+    for name, rate in baseline['raids_per_second'].items():
+        if name in results['raids_per_second'] and results['raids_per_second'][name] < rate * (1 - tolerance):
+            failures.append(f"{name} dropped from {rate:.0f} to {results['raids_per_second'][name]:.0f} raids/s")
+    for name, megabytes in baseline['peak_mb'].items():
+        if name in results['peak_mb'] and results['peak_mb'][name] > megabytes * (1 + tolerance):
+            failures.append(f"{name} grew from {megabytes:.1f} to {results['peak_mb'][name]:.1f} MB peak")
+    for name, seconds in dict(baseline['post_processing'], startup=baseline['startup']).items():
+        current = results['startup'] if name == 'startup' else results['post_processing'].get(name)
+        if current is not None and current > seconds * (1 + tolerance):
+            failures.append(f"{name} slowed from {seconds * 1000:.1f} to {current * 1000:.1f} ms")
+    return failures
+
+# Benchmarks every engine on x raids of the reference scenario from a fixed seed: raids per second, peak memory
+# (the tracemalloc peak of a run of BENCHMARK_MEMORY_RAIDS raids, worker processes aren't counted), startup time and the
+# post-processing, then checks that all engines agree with the batch engine. If the baseline file exists the results
+# are also gated against it, set save to write them to it afterwards. Returns the results with a list of failures,
+# empty if everything passed.
+def run_benchmarks(x=50000, seed=0, workers=None, baseline=BENCHMARK_BASELINE, save=False, tolerance=0.25, confidence=0.999):
+    results = {'raids': x, 'seed': seed, 'memory_raids': BENCHMARK_MEMORY_RAIDS, 'raids_per_second': {}, 'peak_mb': {}}
+    histograms = {}
+    with load_scenario(REFERENCE_SCENARIO).applied():
+        engines = benchmark_engines(x, seed, workers)
+        memory_engines = benchmark_engines(BENCHMARK_MEMORY_RAIDS, seed, workers)
+        warm_up_engines(min(x, 1000), seed, workers)
+        for name, engine in engines.items():
+            start = time.perf_counter()
+            histograms[name] = engine()
+            results['raids_per_second'][name] = x / (time.perf_counter() - start)
+            tracemalloc.start()
+            memory_engines[name]()
+            results['peak_mb'][name] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+            print(f"{name:<20} {results['raids_per_second'][name]:>10.0f} raids/s {results['peak_mb'][name]:>10.1f} MB peak")
+        ticks, _, overkill = killTektonBatch(x, np.random.default_rng(seed))
+        results['post_processing'] = benchmark_post_processing(histograms['batch'], ticks, overkill)
+        results['agreement'] = check_agreement(histograms, confidence=confidence)
+    results['startup'], results['python_startup'] = import_seconds()
+    for name, seconds in results['post_processing'].items():
+        print(f"{name:<20} {seconds * 1000:>10.1f} ms")
+    print(f"{'startup':<20} {results['startup'] * 1000:>10.1f} ms (Python alone {results['python_startup'] * 1000:.1f} ms)")
+    failures = [f"{row['engine']} disagrees on {row['stat']}: {row['value']:.3f} against {row['reference']:.3f} (z = {row['z']:.2f})"
+                for row in results['agreement'] if not row['agrees']]
+    if os.path.exists(baseline):
+        with open(baseline) as f:
+            failures += check_baseline(results, json.load(f), tolerance)
+    if save:
+        with open(baseline, 'w') as f:
+            json.dump({key: value for key, value in results.items() if key != 'agreement'}, f, indent=2)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    results['failures'] = failures
+    return results
+
+# Main function to start the simulator. Set batch to use the vectorized engine, or workers to spread it over processes.
+# Set rate_half_width to keep simulating until the rates are that precise instead, with x as the upper limit.
+# Set early_exit to stop simulating raids as soon as they're certain to be left.
+# Set store to load the kills from the result store, only simulating the ones it's missing.
+# Set compiled to use the tick loop compiled by Numba, see killTektonCompiled.
+def main(x, batch=False, workers=None, seed=None, rate_half_width=None, mean_half_width=0.01, early_exit=False, store=False, compiled=False):
+    if store:
+        histogram = stored_table(x).histogram()
+    elif rate_half_width:
+        histogram = sim_until(rate_half_width, mean_half_width, max_simulations=x, rng=np.random.default_rng(seed))
+        print_confidence(histogram)
+    elif workers:
+        histogram = run_parallel(x, seed, workers)
+    elif batch:
+        histogram = sim_histogram(x, np.random.default_rng(seed), early_exit)
+    elif compiled:
+        histogram = KillHistogram()
+        histogram.add_batch(*killTektonCompiled(x, seed, early_exit))
+    else:
+        histogram = KillHistogram()
+        for i in range(x):
+            histogram.add(*killTekton(early_exit=early_exit))
+    construct_graph(histogram)
 
+    #print(f"{round(histogram.run_rate(), 2)}%")
+    #print(f"Zero def rate is {round(histogram.zero_def_rate(), 2)}%")
+    #print(f"Leave rate is {round(histogram.leave_rate(), 2)}%")
+    #print(f'Raids left: {histogram.raids_left}')
 
 if __name__ == '__main__':
     main(1000000)  # Number of times to run the simulator